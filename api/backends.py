@@ -0,0 +1,229 @@
+"""Backends that check the registration status of a domain"""
+import asyncio
+import datetime
+import importlib
+import json
+import weakref
+from functools import lru_cache
+from importlib.util import find_spec
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple, Optional, Tuple
+
+from django.utils.module_loading import import_string
+
+from . import whoisclient
+from .conf import get_setting
+from .scheduler import whois_server
+
+if TYPE_CHECKING:
+    import httpx
+
+BUNDLED_RDAP_BOOTSTRAP = Path(__file__).resolve().parent / "data" / "rdap_dns.json"
+
+# found without importing it, httpx imports it for the first HTTP/2 client
+HTTP2 = find_spec("h2") is not None
+
+
+class BackendError(Exception):
+    """Raised when a backend gets an answer it can't make sense of"""
+
+
+class Registration(NamedTuple):
+    """
+    The answer of a lookup.
+
+    Attributes:
+        registered (bool): if the domain is registered
+        expires (date): when the registration expires, if the registry said so
+        source (str): what answered, e.g. "whois", "rdap" or "dns"
+    """
+
+    registered: bool
+    expires: Optional[datetime.date]
+    source: str
+
+
+class LookupBackend:
+    """
+    Base class of the lookup backends.
+
+    Backends import the clients they look domains up with when they first
+    need them, not with the app, and list them in `modules` so that they can
+    be imported ahead of the first lookup (see `prepare`).
+    """
+
+    source = None
+    modules: Tuple[str, ...] = ()
+
+    def prepare(self):
+        """Imports the modules of the backend, so the first lookup doesn't."""
+        for module in self.modules:
+            importlib.import_module(module)
+
+    async def is_registered(self, name: str, tld: str) -> bool:
+        """
+        Checks if a domain is registered.
+
+        Args:
+            name (str): the domain name to lookup.
+            tld (str): the tld of the domain.
+
+        Returns:
+            True if the domain is registered, False otherwise.
+        """
+        raise NotImplementedError
+
+    async def lookup(self, name: str, tld: str, details: bool = True) -> Registration:
+        """
+        Checks if a domain is registered, and until when if the backend knows.
+
+        Args:
+            name (str): the domain name to lookup.
+            tld (str): the tld of the domain.
+            details (bool): if False, the backend may skip reading anything
+                but whether the domain is registered
+
+        Returns:
+            The Registration of the domain.
+        """
+        return Registration(await self.is_registered(name, tld), None, self.source)
+
+
+class WhoisBackend(LookupBackend):
+    """
+    Queries the WHOIS servers (port 43) of the registries.
+
+    With the default "raw" WHOIS_CLIENT, availability is read from the raw
+    answer with the "no match" signature of the registry, and the answer is
+    only parsed when details are asked for, off the event loop. The
+    "asyncwhois" client parses every answer as it comes.
+    """
+
+    source = "whois"
+    modules = ("asyncwhois",)
+
+    async def is_registered(self, name: str, tld: str) -> bool:
+        return (await self.lookup(name, tld, details=False)).registered
+
+    async def lookup(self, name: str, tld: str, details: bool = True) -> Registration:
+        domain = f"{name}.{tld}"
+        if get_setting("WHOIS_CLIENT") == "asyncwhois":
+            import asyncwhois  # pylint: disable=import-outside-toplevel
+
+            try:
+                parsed = (await asyncwhois.aio_whois_domain(domain)).parser_output
+            except asyncwhois.errors.NotFoundError:
+                return Registration(False, None, self.source)
+        else:
+            answer = await whoisclient.fetch(domain, whois_server(tld))
+            if answer.available:
+                return Registration(False, None, self.source)
+            if not details:
+                return Registration(True, None, self.source)
+            parsed = await whoisclient.parse(answer, tld)
+
+        expires = parsed.get("expires")
+        if not isinstance(expires, datetime.datetime):
+            # dates in a format the parser doesn't know are left as text
+            expires = None
+        return Registration(True, expires and expires.date(), self.source)
+
+
+class RDAPBackend(LookupBackend):
+    """
+    Queries the RDAP servers of the registries.
+
+    The server of a TLD is found in the IANA bootstrap file. Connections to
+    every server are pooled and kept alive (over HTTP/2 if `h2` is installed).
+    TLDs without an RDAP server are looked up with WHOIS.
+    """
+
+    source = "rdap"
+    modules = ("httpx", *(("h2",) if HTTP2 else ()), *WhoisBackend.modules)
+
+    def __init__(self):
+        self.fallback = WhoisBackend()
+        # httpx clients are bound to the event loop they were first used on
+        self._clients = weakref.WeakKeyDictionary()
+
+    async def is_registered(self, name: str, tld: str) -> bool:
+        if rdap_base_url(tld) is None:
+            return await self.fallback.is_registered(name, tld)
+        return (await self.lookup(name, tld)).registered
+
+    async def lookup(self, name: str, tld: str, details: bool = True) -> Registration:
+        base_url = rdap_base_url(tld)
+        if base_url is None:
+            return await self.fallback.lookup(name, tld, details)
+
+        resp = await self._client(base_url).get(f"domain/{name}.{tld}")
+        if resp.status_code == 404:
+            return Registration(False, None, self.source)
+        resp.raise_for_status()
+
+        data = resp.json()
+        if data.get("objectClassName") != "domain":
+            raise BackendError(f"unexpected RDAP answer for {name}.{tld}")
+        return Registration(True, _expiration(data), self.source)
+
+    def _client(self, base_url: str) -> "httpx.AsyncClient":
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        if base_url not in clients:
+            import httpx  # pylint: disable=import-outside-toplevel
+
+            max_connections = get_setting("RDAP_MAX_CONNECTIONS")
+            clients[base_url] = httpx.AsyncClient(
+                base_url=base_url,
+                http2=HTTP2,
+                timeout=get_setting("RDAP_TIMEOUT"),
+                headers={"Accept": "application/rdap+json"},
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+            )
+        return clients[base_url]
+
+
+def _expiration(data: dict) -> Optional[datetime.date]:
+    for event in data.get("events", []):
+        if event.get("eventAction") == "expiration":
+            try:
+                # e.g. 2028-09-14T04:00:00Z
+                return datetime.date.fromisoformat(event["eventDate"][:10])
+            except (KeyError, TypeError, ValueError):
+                return None
+    return None
+
+
+@lru_cache(maxsize=None)
+def rdap_bootstrap() -> dict:
+    """
+    Returns a dict mapping each TLD to the base url of its RDAP server.
+    """
+    path = get_setting("RDAP_BOOTSTRAP_FILE") or BUNDLED_RDAP_BOOTSTRAP
+    with open(path, encoding="utf-8") as bootstrap_file:
+        services = json.load(bootstrap_file)["services"]
+
+    base_urls = {}
+    for tlds, urls in services:
+        # prefer https, and make relative paths resolve under the base url
+        url = sorted(urls, key=lambda url: not url.startswith("https"))[0]
+        for tld in tlds:
+            base_urls[tld] = url if url.endswith("/") else url + "/"
+    return base_urls
+
+
+def rdap_base_url(tld: str):
+    """
+    Returns the base url of the RDAP server of `tld`, or None if it has none.
+    """
+    return rdap_bootstrap().get(tld.rsplit(".", maxsplit=1)[-1].lower())
+
+
+@lru_cache(maxsize=None)
+def get_backend() -> LookupBackend:
+    """
+    Returns the lookup backend selected by the LOOKUP_BACKEND setting.
+    """
+    return import_string(get_setting("LOOKUP_BACKEND"))()
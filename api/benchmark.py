@@ -0,0 +1,410 @@
+"""Offline load tests of the engine and the views, against fake upstreams"""
+import asyncio
+import json
+import math
+import random
+import time
+import zlib
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+from django.conf import settings
+from django.test import AsyncClient, override_settings
+
+from . import candidates, datamuse, engine, policy, tldplan
+from .cache import get_response_cache, get_result_cache
+from .conf import get_setting
+from .policy import LatencyTracker
+from .tldplan import HitRates
+
+TLDS = ("com", "net", "org", "dev", "io")
+
+# metrics of a scenario compared against the baseline, and whether higher is better
+COMPARED = {
+    "throughput": True,
+    "p50": False,
+    "p95": False,
+    "p99": False,
+    "whois_queries_per_request": False,
+    "datamuse_requests_per_request": False,
+}
+
+
+class FakeServer:
+    """
+    Base class of the fake upstreams, a TCP server on a free local port.
+
+    Attributes:
+        latency (float): seconds before every answer
+        jitter (float): up to this many seconds are added to the latency at random
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._server = None
+        # the tasks handling the open connections, and their writers
+        self._connections = {}
+
+    async def start(self) -> str:
+        """Starts listening and returns the "host:port" of the server."""
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"{host}:{port}"
+
+    async def stop(self):
+        """
+        Stops listening, cancels the handlers of the connections kept alive
+        and waits for them to finish, then closes the connections.
+        """
+        self._server.close()
+        handlers = list(self._connections.items())
+        for handler, _ in handlers:
+            handler.cancel()
+        await asyncio.gather(
+            *(handler for handler, _ in handlers), return_exceptions=True
+        )
+        for _, writer in handlers:
+            writer.close()
+        await self._server.wait_closed()
+
+    def reset(self):
+        """Zeroes the counters."""
+
+    async def _delay(self):
+        await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+
+    async def _serve(self, reader, writer):
+        handler = asyncio.current_task()
+        self._connections[handler] = writer
+        try:
+            await self._handle(reader, writer)
+        finally:
+            del self._connections[handler]
+
+    async def _handle(self, reader, writer):
+        raise NotImplementedError
+
+
+class FakeWhoisServer(FakeServer):
+    """
+    WHOIS server (the port 43 protocol) answering from made up registrations.
+
+    Whether a domain is registered is decided by a hash of its name, so the
+    answers are the same from one run to the next.
+
+    Attributes:
+        error_rate (float): share of the queries whose connection is reset
+        rate (float): queries per second answered, the others are reset like
+            registries do when they're queried too often (None for no limit)
+        registered (float): share of the domains that are registered
+        queries (int): the queries received
+        errors (int): the queries reset because of `error_rate`
+        throttled (int): the queries reset because of `rate`
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate: float = None,
+        registered: float = 0.5,
+        seed: int = 0,
+    ):
+        super().__init__(latency, jitter, seed)
+        self.error_rate = error_rate
+        self.rate = rate
+        self.registered = registered
+        self._tokens = rate
+        self._updated_at = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.errors = 0
+        self.throttled = 0
+
+    def is_registered(self, domain: str) -> bool:
+        """Returns if the server says `domain` is registered."""
+        return zlib.crc32(domain.lower().encode()) % 1000 < self.registered * 1000
+
+    def answer(self, domain: str) -> str:
+        """Returns the WHOIS answer for `domain`."""
+        if not self.is_registered(domain):
+            return f'No match for "{domain.upper()}".\r\n'
+        return (
+            f"Domain Name: {domain.upper()}\r\n"
+            "Registry Expiry Date: 2030-01-01T00:00:00Z\r\n"
+        )
+
+    async def _handle(self, reader, writer):
+        try:
+            domain = (await reader.readline()).decode().strip()
+            self.queries += 1
+            if not self._take_token():
+                self.throttled += 1
+                writer.transport.abort()
+                return
+
+            await self._delay()
+            if self._random.random() < self.error_rate:
+                self.errors += 1
+                writer.transport.abort()
+                return
+
+            writer.write(self.answer(domain).encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _take_token(self) -> bool:
+        if self.rate is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(
+            self.rate, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class FakeDatamuseServer(FakeServer):
+    """
+    HTTP server answering the endpoints of Datamuse with made up words.
+
+    Attributes:
+        requests (int): the requests received
+    """
+
+    SUFFIXES = ("s", "ly", "er", "ify", "hub")
+
+    def __init__(self, latency: float = 0.02, jitter: float = 0.0, seed: int = 0):
+        super().__init__(latency, jitter, seed)
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+
+    async def _handle(self, reader, writer):
+        try:
+            # connections are kept alive by the client
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                self.requests += 1
+                target = head.split(b" ", 2)[1].decode()
+                # the seed word is the value of the last parameter, e.g. ml=coffee
+                word = parse_qsl(urlsplit(target).query)[-1][1]
+
+                await self._delay()
+                body = json.dumps(
+                    [{"word": word + suffix, "score": 100} for suffix in self.SUFFIXES]
+                ).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(body) + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _similar_domains(client: AsyncClient, name: str, tld: str) -> bool:
+    await engine.similar_domains(
+        name,
+        tld,
+        deadline=get_setting("SIMILAR_DEADLINE"),
+        budget=get_setting("SIMILAR_TLD_BUDGET"),
+    )
+    return True
+
+
+async def _registration_status(client: AsyncClient, name: str, tld: str) -> bool:
+    resp = await client.get("/api/v1/registrationStatus", {"domain": f"{name}.{tld}"})
+    return resp.status_code == 200
+
+
+async def _similar_domains_view(client: AsyncClient, name: str, tld: str) -> bool:
+    resp = await client.get("/api/v1/similarDomains", {"domain": f"{name}.{tld}"})
+    return resp.status_code == 200
+
+
+# scenario -> one request of it, which returns if it succeeded
+SCENARIOS = {
+    "engine": _similar_domains,
+    "registration": _registration_status,
+    "similar": _similar_domains_view,
+}
+
+
+def make_domains(count: int, seed: int = 0) -> List[tuple]:
+    """
+    Returns `count` (name, tld) pairs made of two words of the bundled list,
+    the same for the same seed.
+    """
+    rng = random.Random(seed)
+    words = [
+        word.strip()
+        for word in candidates.read_words(candidates.BUNDLED_WORDS)
+        if word.strip().isalpha()
+    ]
+    return [
+        (rng.choice(words) + rng.choice(words), rng.choice(TLDS)) for _ in range(count)
+    ]
+
+
+async def run(
+    scenarios: List[str],
+    requests: int,
+    concurrency: int,
+    whois: FakeWhoisServer,
+    datamuse_server: FakeDatamuseServer,
+    seed: int = 0,
+    overrides: dict = None,
+) -> Dict[str, dict]:
+    """
+    Runs the scenarios one after the other against the fake upstreams.
+
+    Every scenario starts with empty caches and no recorded latencies, and
+    looks up the same domains. The lookup store is disabled so that no
+    database is needed.
+
+    Args:
+        scenarios (List[str]): names of SCENARIOS to run
+        requests (int): the requests of every scenario
+        concurrency (int): the requests in flight at once
+        whois (FakeWhoisServer): answers every WHOIS query
+        datamuse_server (FakeDatamuseServer): answers every Datamuse request
+        seed (int): seed of the domains looked up
+        overrides (dict): DOMAIN_FINDER settings of the run
+
+    Returns:
+        The results of every scenario, see `run_scenario`.
+    """
+    whois_address = await whois.start()
+    datamuse_address = await datamuse_server.start()
+    domain_finder = {
+        **getattr(settings, "DOMAIN_FINDER", {}),
+        "CACHE_ALIAS": None,
+        "LOOKUP_STORE": False,
+        **(overrides or {}),
+        "WHOIS_ADDRESSES": {"*": whois_address},
+        "DATAMUSE_URL": f"http://{datamuse_address}",
+    }
+    domains = make_domains(requests, seed)
+
+    results = {}
+    try:
+        with override_settings(DOMAIN_FINDER=domain_finder):
+            for scenario in scenarios:
+                _reset(whois, datamuse_server)
+                results[scenario] = await run_scenario(
+                    SCENARIOS[scenario], domains, concurrency
+                )
+                results[scenario].update(
+                    whois_queries=whois.queries,
+                    whois_errors=whois.errors,
+                    whois_throttled=whois.throttled,
+                    datamuse_requests=datamuse_server.requests,
+                    whois_queries_per_request=whois.queries / requests,
+                    datamuse_requests_per_request=datamuse_server.requests / requests,
+                )
+    finally:
+        await whois.stop()
+        await datamuse_server.stop()
+    return results
+
+
+async def run_scenario(request, domains: List[tuple], concurrency: int) -> dict:
+    """
+    Sends a request per domain, `concurrency` at a time.
+
+    Returns:
+        A dict of the requests sent, the errors, the seconds they took, the
+        throughput (requests per second) and the p50, p95 and p99 latencies
+        in milliseconds.
+    """
+    client = AsyncClient()
+    pending = iter(domains)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for name, tld in pending:
+            started = time.perf_counter()
+            try:
+                succeeded = await request(client, name, tld)
+            except Exception:  # pylint: disable=broad-except
+                succeeded = False
+            latencies.append(time.perf_counter() - started)
+            errors += not succeeded
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(domains),
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput": len(domains) / elapsed,
+        **{f"p{q}": percentile(latencies, q / 100) * 1000 for q in (50, 95, 99)},
+    }
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Returns the `q` quantile of `samples` (nearest rank), None if empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def compare(baseline: dict, report: dict, tolerance: float) -> List[str]:
+    """
+    Compares a report to a baseline written by an earlier run.
+
+    Args:
+        baseline (dict): the baseline report
+        report (dict): the report of this run
+        tolerance (float): the relative change allowed, e.g. 0.1 for 10%
+
+    Returns:
+        A line per metric that got worse by more than `tolerance`.
+    """
+    regressions = []
+    for scenario, result in report["scenarios"].items():
+        base = baseline["scenarios"].get(scenario)
+        if base is None:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            before, after = base.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(
+                    f"{scenario} {metric}: {before:.2f} -> {after:.2f} "
+                    f"({change:+.0%})"
+                )
+    return regressions
+
+
+def _reset(*servers: FakeServer):
+    for server in servers:
+        server.reset()
+    get_result_cache().local.clear()
+    get_response_cache().clear()
+    datamuse._suggestions.clear()  # pylint: disable=protected-access
+    policy.latencies = LatencyTracker()
+    tldplan.hit_rates = HitRates()
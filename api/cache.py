@@ -0,0 +1,193 @@
+"""Caches for the results of domain lookups"""
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+
+from .conf import get_setting
+from .sharedstate import get_host_cache
+
+
+class LRUCache:
+    """
+    In-process least-recently-used cache with a TTL per entry.
+
+    Attributes:
+        maxsize (int): the maximum number of entries kept
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        Returns the value stored under `key`, or None if it's missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def ttl(self, key) -> float:
+        """
+        Returns the seconds the entry of `key` stays fresh, 0 if it's missing.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        return 0 if entry is None else max(0, entry[0] - time.time())
+
+    def set(self, key, value, ttl: float):
+        """Stores `value` under `key` for `ttl` seconds."""
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Removes every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedCache:
+    """
+    Cache backed by one of django's caches, so that it's shared between workers.
+
+    Attributes:
+        alias (str): the alias of the django cache to use
+    """
+
+    def __init__(self, alias: str):
+        self.alias = alias
+
+    @property
+    def _backend(self):
+        # pylint: disable=import-outside-toplevel
+        from django.core.cache import caches
+
+        return caches[self.alias]
+
+    def get(self, key):
+        """
+        Returns a `(value, expires_at)` tuple stored under `key`, or None.
+        """
+        return self._backend.get(_shared_key(key))
+
+    def set(self, key, value, ttl: float):
+        """Stores `value` under `key` for `ttl` seconds."""
+        self._backend.set(_shared_key(key), (value, time.time() + ttl), timeout=ttl)
+
+
+class ResultCache:
+    """
+    Multi level cache of lookup results.
+
+    The in-process LRU is consulted first. On a miss the cache of the host
+    (if any), then the shared cache (if any) are consulted, and an answer is
+    copied into the levels that missed for the time it has left.
+
+    Attributes:
+        local (LRUCache): the in-process cache
+        shared (SharedCache): the optional cache shared between workers
+        host (HostCache): the optional cache shared by the processes of the
+            host, in memory
+    """
+
+    def __init__(self, local: LRUCache, shared: SharedCache = None, host=None):
+        self.local = local
+        self.shared = shared
+        self.host = host
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None on a miss.
+        """
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        missed = [self.local]
+        for level in (self.host, self.shared):
+            if level is None:
+                continue
+            entry = level.get(key)
+            remaining = None if entry is None else entry[1] - time.time()
+            if remaining is None or remaining <= 0:
+                missed.append(level)
+                continue
+
+            value = entry[0]
+            for upper in missed:
+                upper.set(key, value, remaining)
+            return value
+        return None
+
+    def ttl(self, key) -> float:
+        """
+        Returns the seconds the cached value of `key` stays fresh, as kept by
+        the first level that has it, 0 if none has.
+        """
+        remaining = self.local.ttl(key)
+        if remaining:
+            return remaining
+        for level in (self.host, self.shared):
+            entry = None if level is None else level.get(key)
+            if entry is not None and entry[1] > time.time():
+                return entry[1] - time.time()
+        return 0
+
+    def set(self, key, value, ttl: float):
+        """Stores `value` under `key` in every level for `ttl` seconds."""
+        self.local.set(key, value, ttl)
+        if self.host is not None:
+            self.host.set(key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+
+
+@lru_cache(maxsize=None)
+def get_result_cache() -> ResultCache:
+    """
+    Returns the process wide result cache, built from the settings.
+    """
+    alias = get_setting("CACHE_ALIAS")
+    return ResultCache(
+        LRUCache(get_setting("CACHE_SIZE")),
+        SharedCache(alias) if alias else None,
+        get_host_cache(),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> LRUCache:
+    """
+    Returns the process wide cache of the responses of the lookup endpoints.
+    """
+    return LRUCache(get_setting("RESPONSE_CACHE_SIZE"))
+
+
+def result_ttl(registered: bool) -> float:
+    """
+    Returns how long (in seconds) a lookup result stays fresh.
+
+    Args:
+        registered (bool): the result of the lookup
+    """
+    if registered:
+        return get_setting("CACHE_REGISTERED_TTL")
+    return get_setting("CACHE_AVAILABLE_TTL")
+
+
+def _shared_key(key: str) -> str:
+    return f"domain_finder:lookup:{key}"
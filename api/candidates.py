@@ -0,0 +1,235 @@
+"""Generates domain name candidates locally, from a bundled word list"""
+import mmap
+import re
+import string
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from .conf import get_setting
+from .validators import MAX_LABEL_LENGTH, MIN_LABEL_LENGTH, is_valid_name
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+BUNDLED_WORDS = DATA_DIR / "words.txt"
+BUNDLED_INDEX = DATA_DIR / "words.idx"
+
+PREFIXES = ("get", "try", "my", "the", "go", "use", "join", "hey")
+SUFFIXES = ("app", "hq", "hub", "ly", "ify", "labs", "now", "online", "io", "co")
+
+# spelling -> spellings that sound the same
+PHONETIC = {
+    "ph": ("f",),
+    "f": ("ph",),
+    "ck": ("k", "c"),
+    "c": ("k",),
+    "k": ("c",),
+    "s": ("z",),
+    "z": ("s",),
+    "ee": ("ea", "i"),
+    "ea": ("ee",),
+    "oo": ("u",),
+    "ou": ("u",),
+    "y": ("i", "ie"),
+    "er": ("r",),
+    "x": ("ks",),
+    "qu": ("kw",),
+}
+_PHONETIC_RE = re.compile("|".join(sorted(PHONETIC, key=len, reverse=True)))
+
+# base score of each kind of candidate, real words get a bonus on top
+SCORES = {
+    "plural": 0.9,
+    "compound": 0.85,
+    "neighbour": 0.8,
+    "affix": 0.6,
+    "phonetic": 0.6,
+    "hyphenated": 0.4,
+}
+WORD_BONUS = 0.2
+
+
+class WordIndex:
+    """
+    Sorted word list in a memory-mapped file of fixed width records.
+
+    Lookups are binary searches over the mapped file, so the list isn't
+    loaded into memory and is shared between the workers of a host.
+
+    Attributes:
+        width (int): bytes per record, longer words aren't indexed
+    """
+
+    MAGIC = b"DFWI"
+    HEADER = struct.Struct("!4sHH")
+
+    def __init__(self, path):
+        with open(path, "rb") as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.width, _ = self.HEADER.unpack_from(self._map)
+        if magic != self.MAGIC:
+            raise ValueError(f"{path} isn't a word index")
+        self._count = (len(self._map) - self.HEADER.size) // self.width
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, word: str) -> bool:
+        key = word.encode("ascii", errors="replace").ljust(self.width, b"\0")
+        if len(key) > self.width:
+            return False
+
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            record = self._record(middle)
+            if record < key:
+                low = middle + 1
+            elif record > key:
+                high = middle
+            else:
+                return True
+        return False
+
+    def _record(self, i: int) -> bytes:
+        start = self.HEADER.size + i * self.width
+        return self._map[start : start + self.width]
+
+    @classmethod
+    def build(cls, words: Iterable[str], path, width: int = 16) -> int:
+        """
+        Writes an index of `words` to `path`.
+
+        Returns:
+            The number of words indexed.
+        """
+        records = sorted(
+            {
+                word.encode("ascii").ljust(width, b"\0")
+                for word in (word.strip().lower() for word in words)
+                if word and word.isascii() and word.isalpha() and len(word) <= width
+            }
+        )
+        with open(path, "wb") as index_file:
+            index_file.write(cls.HEADER.pack(cls.MAGIC, width, 0))
+            index_file.writelines(records)
+        return len(records)
+
+
+@lru_cache(maxsize=None)
+def get_word_index() -> WordIndex:
+    """
+    Returns the word index, built from the bundled word list if missing.
+    """
+    path = Path(get_setting("CANDIDATES_INDEX") or BUNDLED_INDEX)
+    if not path.exists():
+        WordIndex.build(read_words(BUNDLED_WORDS), path)
+    return WordIndex(path)
+
+
+def read_words(path) -> Iterable[str]:
+    """Yields the words of a newline delimited word list, skipping comments."""
+    with open(path, encoding="utf-8") as words_file:
+        for line in words_file:
+            if not line.startswith("#"):
+                yield line
+
+
+def similar_names(name: str, limit: int) -> List[str]:
+    """
+    Generates names similar to `name`, best first.
+
+    Args:
+        name (str): the domain name
+        limit (int): the maximum number of names returned
+
+    Returns:
+        Valid domain names other than `name`.
+    """
+    name = name.lower()
+    words = get_word_index()
+    scores: Dict[str, float] = {}
+
+    def add(candidate: str, kind: str):
+        if candidate == name:
+            return
+        if not MIN_LABEL_LENGTH <= len(candidate) <= MAX_LABEL_LENGTH:
+            return
+        score = SCORES[kind] + (WORD_BONUS if candidate in words else 0)
+        # shorter names make better domains
+        score -= len(candidate) / 1000
+        if score > scores.get(candidate, -1):
+            scores[candidate] = score
+
+    for plural in _plurals(name):
+        add(plural, "plural")
+
+    for first, second in _compound_splits(name, words):
+        add(f"{first}-{second}", "compound")
+        add(second + first, "compound")
+        add(first, "compound")
+        add(second, "compound")
+
+    for neighbour in _edits(name):
+        if neighbour in words:
+            add(neighbour, "neighbour")
+
+    for prefix in PREFIXES:
+        add(prefix + name, "affix")
+    for suffix in SUFFIXES:
+        add(name + suffix, "affix")
+        add(f"{name}-{suffix}", "hyphenated")
+
+    for variant in _phonetic_variants(name):
+        add(variant, "phonetic")
+
+    ranked = sorted(scores, key=lambda candidate: (-scores[candidate], candidate))
+    return [candidate for candidate in ranked if is_valid_name(candidate)][:limit]
+
+
+def _plurals(name: str) -> List[str]:
+    if name.endswith("ies"):
+        return [name[:-3] + "y"]
+    if name.endswith(("ses", "xes", "zes", "ches", "shes")):
+        return [name[:-2]]
+    if name.endswith("s") and not name.endswith("ss"):
+        return [name[:-1]]
+    if name.endswith("y") and name[-2:-1] not in "aeiou":
+        return [name[:-1] + "ies"]
+    if name.endswith(("s", "x", "z", "ch", "sh")):
+        return [name + "es"]
+    return [name + "s"]
+
+
+def _compound_splits(name: str, words: WordIndex) -> List[tuple]:
+    return [
+        (name[:i], name[i:])
+        for i in range(MIN_LABEL_LENGTH, len(name) - MIN_LABEL_LENGTH + 1)
+        if name[:i] in words and name[i:] in words
+    ]
+
+
+def _edits(name: str) -> set:
+    """Names at an edit distance of one"""
+    letters = string.ascii_lowercase
+    splits = [(name[:i], name[i:]) for i in range(len(name) + 1)]
+    deletes = [left + right[1:] for left, right in splits if right]
+    transposes = [
+        left + right[1] + right[0] + right[2:]
+        for left, right in splits
+        if len(right) > 1
+    ]
+    replaces = [
+        left + c + right[1:] for left, right in splits if right for c in letters
+    ]
+    inserts = [left + c + right for left, right in splits for c in letters]
+    return set(deletes + transposes + replaces + inserts)
+
+
+def _phonetic_variants(name: str) -> set:
+    variants = set()
+    for match in _PHONETIC_RE.finditer(name):
+        for replacement in PHONETIC[match.group()]:
+            variants.add(name[: match.start()] + replacement + name[match.end() :])
+    return variants
@@ -0,0 +1,174 @@
+"""Settings of the lookup engine and their defaults"""
+from django.conf import settings
+
+DEFAULTS = {
+    # maximum number of entries held by the in-process result cache
+    "CACHE_SIZE": 10000,
+    # seconds a "registered" answer stays fresh
+    "CACHE_REGISTERED_TTL": 24 * 60 * 60,
+    # seconds an "available" answer stays fresh
+    "CACHE_AVAILABLE_TTL": 60 * 60,
+    # maximum number of responses of the lookup endpoints held in process,
+    # each for as long as the answers it's made of stay fresh (0 disables it)
+    "RESPONSE_CACHE_SIZE": 10000,
+    # alias of a django cache (see settings.CACHES) shared between workers
+    "CACHE_ALIAS": None,
+    # directory of the memory-mapped files of the result cache and the WHOIS
+    # rate limits shared by the processes of a host, and of the metrics of
+    # every process, e.g. a directory in /dev/shm (None keeps them per process)
+    "SHARED_STATE_DIR": None,
+    # entries of the shared result cache, 32 bytes each
+    "SHARED_CACHE_SLOTS": 1 << 20,
+    # seconds between two exports of the metrics of a process to SHARED_STATE_DIR
+    "METRICS_EXPORT_INTERVAL": 5,
+    # base url of the Datamuse API
+    "DATAMUSE_URL": "https://api.datamuse.com",
+    # seconds before a request to Datamuse is abandoned
+    "DATAMUSE_TIMEOUT": 5,
+    # size of the connection pool to Datamuse
+    "DATAMUSE_MAX_CONNECTIONS": 20,
+    # seconds the suggestions for a seed word are cached
+    "DATAMUSE_CACHE_TTL": 24 * 60 * 60,
+    # maximum number of WHOIS queries in flight
+    "WHOIS_MAX_IN_FLIGHT": 100,
+    # maximum number of concurrent queries to a single WHOIS server
+    "WHOIS_SERVER_CONCURRENCY": 10,
+    # queries per second allowed to a single WHOIS server, and its burst
+    "WHOIS_SERVER_RATE": 10,
+    "WHOIS_SERVER_BURST": 10,
+    # overrides of the above per server, e.g.
+    # {"whois.verisign-grs.com": {"CONCURRENCY": 20, "RATE": 30, "BURST": 30}}
+    "WHOIS_SERVER_LIMITS": {},
+    # "raw" reads availability from the raw WHOIS answer with the "no match"
+    # signature of the registry, and only parses answers when the expiration
+    # is needed; "asyncwhois" parses every answer (and can't be redirected
+    # by WHOIS_ADDRESSES)
+    "WHOIS_CLIENT": "raw",
+    # pool answers are parsed in, "thread" or "process", and its size
+    "WHOIS_PARSE_EXECUTOR": "thread",
+    "WHOIS_PARSE_WORKERS": 4,
+    # addresses ("host:port") WHOIS servers are queried at instead of port 43
+    # of their name, "*" for every server, e.g. the fake server of the
+    # benchmark command
+    "WHOIS_ADDRESSES": {},
+    # ask the TLD's nameservers before WHOIS, delegated domains are registered
+    "DNS_PRECHECK": False,
+    # recursive resolver used to find the nameservers of TLDs
+    "DNS_RESOLVER": "8.8.8.8",
+    # nameservers ("host" or "host:port") per tld, instead of looking them up
+    "DNS_TLD_NAMESERVERS": {},
+    # seconds to wait for a DNS answer
+    "DNS_TIMEOUT": 1,
+    # directory of the zone indexes (<tld>.bloom) built by build_zone_index,
+    # domains in the index of their tld are reported registered without a
+    # WHOIS lookup, after the DNS precheck if it's on (None disables them)
+    "ZONE_INDEX_DIR": None,
+    # seconds the domains found in a zone index stay cached when the DNS
+    # precheck is off, they may be false positives of the index
+    "ZONE_INDEX_TTL": 10 * 60,
+    # seconds before a single lookup is abandoned
+    "LOOKUP_TIMEOUT": 10,
+    # retries of lookups that failed with a transient error, and the base
+    # seconds of their jittered exponential backoff
+    "LOOKUP_RETRIES": 2,
+    "LOOKUP_BACKOFF": 0.2,
+    # start a second lookup when the first is slower than the given quantile
+    # of recent lookups to the same server (once enough were recorded)
+    "LOOKUP_HEDGE": False,
+    "LOOKUP_HEDGE_QUANTILE": 0.95,
+    "LOOKUP_HEDGE_MIN_SAMPLES": 20,
+    # dotted path of the backend that checks if a domain is registered
+    "LOOKUP_BACKEND": "api.backends.WhoisBackend",
+    # RDAP bootstrap file, defaults to the one bundled in api/data
+    "RDAP_BOOTSTRAP_FILE": None,
+    # seconds before an RDAP request is abandoned
+    "RDAP_TIMEOUT": 5,
+    # size of the connection pool to every RDAP server
+    "RDAP_MAX_CONNECTIONS": 10,
+    # keep answers in the LookupResult table and read them before looking up,
+    # registered answers are then parsed for their expiration
+    "LOOKUP_STORE": False,
+    # most answers upserted at once, and seconds an answer waits to be written
+    "STORE_BATCH_SIZE": 500,
+    "STORE_FLUSH_INTERVAL": 1,
+    # days before a registration expires from which refresh_lookups checks it
+    "STORE_REFRESH_EXPIRING_DAYS": 30,
+    # lookups in flight while refresh_lookups runs
+    "STORE_REFRESH_CONCURRENCY": 20,
+    # maximum number of domains in a batch request
+    "BATCH_MAX_DOMAINS": 5000,
+    # lookups in flight per batch request
+    "BATCH_CONCURRENCY": 50,
+    # how often a user may send a batch request, as a DRF throttle rate
+    "BATCH_RATE": "60/hour",
+    # seconds after which unfinished similar domain lookups are dropped
+    "SIMILAR_DEADLINE": 15,
+    # tlds similar names are looked up in, POPULAR_TLDS of api.engine by default
+    "SIMILAR_TLDS": None,
+    # seconds the lookups of similar names should take, tlds whose servers
+    # are too slow or busy to answer in time are left out (None keeps all)
+    "SIMILAR_TLD_BUDGET": 5,
+    # seconds between two probes of a server whose tlds were left out, the
+    # searched name is looked up in one of them to measure it again
+    "SIMILAR_TLD_PROBE_INTERVAL": 60,
+    # most searches added to the history at once, and seconds a search waits
+    # to be written
+    "HISTORY_BATCH_SIZE": 500,
+    "HISTORY_FLUSH_INTERVAL": 1,
+    # searches of the history returned per page by /auth/users/me
+    "HISTORY_PAGE_SIZE": 50,
+    # days searches are kept, see the prune_history command
+    "HISTORY_RETENTION_DAYS": 365,
+    # add a Server-Timing header with the time spent in every stage to the
+    # responses of the lookup endpoints
+    "TIMING_HEADER": False,
+    # warm up every process when the server starts it (ASGI lifespan), see
+    # api/warmup.py and the warm_up command
+    "WARMUP_ON_STARTUP": True,
+    # also warm up WSGI processes as they import domain_finder.wsgi, only for
+    # servers importing it once in every worker
+    "WARMUP_WSGI": False,
+    # names looked up in the similar tlds when warming up, before the ones
+    # searched the most
+    "WARMUP_NAMES": [],
+    # most searched names of the history looked up when warming up
+    "WARMUP_HISTORY_NAMES": 50,
+    # days of search history they're counted over
+    "WARMUP_HISTORY_DAYS": 7,
+    # lookups in flight while warming up, and seconds it may take
+    "WARMUP_CONCURRENCY": 20,
+    "WARMUP_DEADLINE": 10,
+    # worker processes started by run_search_workers
+    "JOB_WORKERS": 2,
+    # how often a user may queue a search job, as a DRF throttle rate
+    "JOB_SUBMIT_RATE": "20/hour",
+    # seconds idle workers and job streams wait before checking again
+    "JOB_POLL_INTERVAL": 1,
+    # seconds after which unfinished lookups of a search job are dropped
+    "JOB_DEADLINE": 30 * 60,
+    # maximum number of similar names generated locally for a search job
+    "JOB_CANDIDATES_MAX": 200,
+    # most results of a search job written at once
+    "JOB_RESULTS_BATCH_SIZE": 500,
+    # most results of a search job returned per request
+    "JOB_PAGE_SIZE": 1000,
+    # where similar names come from, "local" (the bundled word list) or "datamuse"
+    "SIMILAR_NAMES_SOURCE": "local",
+    # maximum number of similar names generated locally
+    "CANDIDATES_MAX": 20,
+    # word index used by the local generator, defaults to the one in api/data
+    "CANDIDATES_INDEX": None,
+}
+
+
+def get_setting(name):
+    """
+    Reads a setting from the `DOMAIN_FINDER` dict in the django settings.
+
+    Args:
+        name (str): the name of the setting
+
+    Returns:
+        The configured value, or the default if it isn't configured.
+    """
+    return getattr(settings, "DOMAIN_FINDER", {}).get(name, DEFAULTS[name])
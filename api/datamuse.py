@@ -0,0 +1,82 @@
+"""Async client for the Datamuse API, which suggests words similar to a seed word"""
+import asyncio
+import weakref
+from typing import TYPE_CHECKING, List
+
+from . import metrics
+from .cache import LRUCache
+from .conf import get_setting
+
+if TYPE_CHECKING:
+    import httpx
+
+ENDPOINTS = ("/words?sp=", "/words?sl=", "/words?ml=", "/words?rel_trg=cow")
+WORDS_PER_ENDPOINT = 3
+
+# httpx clients are bound to the event loop they were first used on
+_clients = weakref.WeakKeyDictionary()
+_suggestions = LRUCache(maxsize=1000)
+
+
+async def suggestions(word: str) -> List[str]:
+    """
+    Fetches words similar to `word` from every endpoint concurrently.
+
+    Args:
+        word (str): the seed word
+
+    Returns:
+        The suggested words, at most `WORDS_PER_ENDPOINT` per endpoint.
+
+    Note:
+        Results are cached per seed word unless an endpoint failed.
+    """
+    cached = _suggestions.get(word)
+    if cached is not None:
+        metrics.CACHE_REQUESTS.inc(cache="datamuse", result="hit")
+        return cached
+    metrics.CACHE_REQUESTS.inc(cache="datamuse", result="miss")
+
+    client = _get_client()
+    responses = await asyncio.gather(
+        *[_fetch(client, endpoint, word) for endpoint in ENDPOINTS],
+        return_exceptions=True,
+    )
+
+    words = []
+    failed = False
+    for response in responses:
+        if isinstance(response, Exception):
+            failed = True
+            continue
+        words.extend(entry["word"] for entry in response[0:WORDS_PER_ENDPOINT])
+
+    if not failed:
+        _suggestions.set(word, words, get_setting("DATAMUSE_CACHE_TTL"))
+    return words
+
+
+async def _fetch(client: "httpx.AsyncClient", endpoint: str, word: str) -> list:
+    with metrics.DATAMUSE_DURATION.time(endpoint=endpoint):
+        resp = await client.get(endpoint + word)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _get_client() -> "httpx.AsyncClient":
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # imported by the first suggestions, only the "datamuse" source needs it
+        import httpx  # pylint: disable=import-outside-toplevel
+
+        client = httpx.AsyncClient(
+            base_url=get_setting("DATAMUSE_URL"),
+            timeout=get_setting("DATAMUSE_TIMEOUT"),
+            limits=httpx.Limits(
+                max_connections=get_setting("DATAMUSE_MAX_CONNECTIONS"),
+                max_keepalive_connections=get_setting("DATAMUSE_MAX_CONNECTIONS"),
+            ),
+        )
+        _clients[loop] = client
+    return client
@@ -1,21 +1,25 @@
 """Contains the business logic of the app"""
-from typing import List
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple
 from urllib.parse import urlparse
 import asyncio
-import asyncwhois
-import requests
-from django.core.exceptions import ValidationError
 
-from api.validators import domain_name_validator
-from .models import Domain
+from api.validators import is_valid_name
+from . import candidates, datamuse, metrics, policy, resolver, tldplan, zones
+from .backends import Registration, get_backend
+from .cache import get_result_cache, result_ttl
+from .conf import get_setting
+from .scheduler import get_scheduler, whois_server
+from .singleflight import get_single_flight
+from .store import get_lookup_store
 
 # POPULAR_TLDS = [tld.replace("_", ".") for tld in whois.TLD_RE]
+# looked up when the SIMILAR_TLDS setting isn't set
 POPULAR_TLDS = ["com", "org", "net", "dev", "co"]
 
 
 async def whois_query(name, tld):
     """
-    Does a single whois query.
+    Does a single lookup with the configured backend (WHOIS by default).
 
     Args:
         name (str): the domain name to lookup.
@@ -23,38 +27,286 @@ async def whois_query(name, tld):
 
     Returns:
         True if the domain is registered, False otherwise.
+
+    Note:
+        Answers are cached, registered and available ones with their own TTL.
+        Failed lookups aren't cached.
+
+        With the LOOKUP_STORE setting, answers are also kept in the database
+        and read from there before anything is looked up.
+
+        Lookups are throttled per WHOIS server by the scheduler, and run with
+        the timeout, retries and hedging of the lookup policy.
+
+        With the DNS_PRECHECK setting, domains delegated in DNS are reported
+        registered without a lookup.
+
+        With the ZONE_INDEX_DIR setting, domains in the zone index of their
+        TLD are reported registered without a lookup, and the others skip
+        the DNS precheck.
+
+        Concurrent queries of the same domain share a single lookup.
     """
+    # domain names are case insensitive
+    domain = f"{name}.{tld}".lower()
+
+    registered = get_result_cache().get(domain)
+    if registered is not None:
+        metrics.CACHE_REQUESTS.inc(cache="result", result="hit")
+        return registered
+    metrics.CACHE_REQUESTS.inc(cache="result", result="miss")
+
+    return await get_single_flight().do(
+        domain, lambda: _uncached_query(name, tld, domain)
+    )
+
+
+def freshness(name, tld) -> float:
+    """
+    Returns the seconds the answer `whois_query` gave for a domain stays
+    fresh, whether it was just looked up or read from a cache or the lookup
+    store, 0 if it isn't cached anymore.
+    """
+    return get_result_cache().ttl(f"{name}.{tld}".lower())
+
+
+async def _uncached_query(name, tld, domain):
+    in_zone = zones.in_zone(name, tld)
+    if in_zone is not None:
+        metrics.CACHE_REQUESTS.inc(cache="zone", result="hit" if in_zone else "miss")
+    if in_zone and not get_setting("DNS_PRECHECK"):
+        # may be a false positive of the filter, only cached for a short while
+        get_result_cache().set(domain, True, get_setting("ZONE_INDEX_TTL"))
+        return True
+
+    if get_setting("LOOKUP_STORE"):
+        stored = await get_lookup_store().get(name, tld)
+        metrics.CACHE_REQUESTS.inc(
+            cache="store", result="miss" if stored is None else "hit"
+        )
+        if stored is not None:
+            registered, ttl = stored
+            get_result_cache().set(domain, registered, ttl)
+            return registered
+
+    # names missing from the zone aren't delegated either, the precheck
+    # confirms the ones in it
+    return await _fresh_query(name, tld, domain, precheck=in_zone is not False)
+
+
+async def refresh(name, tld) -> bool:
+    """
+    Looks a domain up again, ignoring its cached and stored answers.
+
+    Args:
+        name (str): the domain name to lookup.
+        tld (str): the tld of the domain.
+
+    Returns:
+        True if the domain is registered, False otherwise.
+    """
+    return await _fresh_query(name, tld, f"{name}.{tld}".lower())
+
+
+async def _fresh_query(name, tld, domain, precheck=True):
+    if (
+        precheck
+        and get_setting("DNS_PRECHECK")
+        and await resolver.is_delegated(name, tld)
+    ):
+        registration = Registration(True, None, "dns")
+    else:
+        server = whois_server(tld)
+        try:
+            # every attempt and hedge takes its own slot, and is only timed
+            # once it's granted
+            registration = await policy.run(
+                lambda: _lookup(name, tld), server, lambda: get_scheduler().slot(tld)
+            )
+        except Exception as exc:
+            metrics.LOOKUP_ERRORS.inc(tld=tld, server=server, error=type(exc).__name__)
+            raise
+
+    get_result_cache().set(
+        domain, registration.registered, result_ttl(registration.registered)
+    )
+    tldplan.hit_rates.record(tld, not registration.registered)
+    if get_setting("LOOKUP_STORE"):
+        get_lookup_store().save(name, tld, registration)
+    return registration.registered
+
+
+async def _lookup(name, tld) -> Registration:
+    with metrics.LOOKUP_DURATION.time(tld=tld, server=whois_server(tld)):
+        # only the lookup store keeps more than whether it's registered
+        return await get_backend().lookup(
+            name, tld, details=get_setting("LOOKUP_STORE")
+        )
+
+
+async def lookup_many(
+    domains: Iterable[tuple], concurrency: int
+) -> AsyncIterator[tuple]:
+    """
+    Looks up many domains, at most `concurrency` at a time.
+
+    Args:
+        domains (Iterable[(str, str)]): (name, tld) pairs to lookup
+        concurrency (int): the maximum number of lookups in flight
+
+    Yields:
+        (name, tld, registered, error) tuples in the order the lookups finish.
+        `registered` is None and `error` holds the exception if a lookup failed.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lookup(name, tld):
+        async with semaphore:
+            try:
+                return (name, tld, await whois_query(name, tld), None)
+            except Exception as exc:  # pylint: disable=broad-except
+                return (name, tld, None, exc)
+
+    tasks = [asyncio.ensure_future(lookup(name, tld)) for name, tld in domains]
     try:
-        return bool(await asyncwhois.aio_whois_domain(f"{name}.{tld}"))
-    except asyncwhois.errors.NotFoundError:
-        return False
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
-async def similar_domains(name, tld):
+async def similar_domains(
+    name, tld, deadline: float = None, budget: float = None
+) -> tuple:
     """
     Finds similar domain names.
 
     Args:
-        domain (Domain): the domain to find similar names to
+        name (str): the domain name to find similar names to
+        tld (str): the tld of the domain
+        deadline (float): seconds after which unfinished lookups are dropped
+        budget (float): seconds the lookups should take, see tldplan.plan
 
     Returns:
-        A list of similar unregistered domain names.
+        (domains, failures): the similar domains (DomainResult), and the
+        LookupFailure of every similar domain that couldn't be looked up.
+    """
+    domains, failures = [], []
+    async for result in iter_similar_domains(name, tld, deadline, budget=budget):
+        if isinstance(result, LookupFailure):
+            failures.append(result)
+        else:
+            domains.append(result)
+    return domains, failures
+
+
+async def iter_similar_domains(
+    name,
+    tld,
+    deadline: float = None,
+    tlds: List[str] = None,
+    max_names: int = None,
+    budget: float = None,
+) -> AsyncIterator:
+    """
+    Finds similar domain names, yielding each as soon as its lookup finishes.
+
+    Args:
+        name (str): the domain name to find similar names to
+        tld (str): the tld of the domain
+        deadline (float): seconds after which unfinished lookups are cancelled
+        tlds (List[str]): the tlds to look up every name in, the SIMILAR_TLDS
+            setting or POPULAR_TLDS by default
+        max_names (int): the most similar names generated locally,
+            CANDIDATES_MAX by default
+        budget (float): seconds the lookups should take, tlds whose servers
+            couldn't answer in time are dropped (see tldplan.plan) but for a
+            probe now and then (see tldplan.probes)
+
+    Yields:
+        Similar domains (DomainResult) in the order their lookups finish, or a
+        LookupFailure for each that failed or was cancelled at the deadline.
+    """
+    loop = asyncio.get_running_loop()
+    ends_at = None if deadline is None else loop.time() + deadline
+
+    names = set([name] + await _similar_names(name, max_names))
+
+    if tlds is None:
+        tlds = get_setting("SIMILAR_TLDS") or POPULAR_TLDS
+    kept = tldplan.plan(tld, tlds, len(names), budget)
+
+    tasks = _create_whois_tasks(names, tlds=kept)
+    if budget is not None:
+        # the name itself is looked up in some dropped tlds so they can recover
+        tasks.update(_create_whois_tasks({name}, tldplan.probes(tld, tlds, kept)))
+    pending = set(tasks)
+    try:
+        while pending:
+            timeout = None if ends_at is None else ends_at - loop.time()
+            if timeout is not None and timeout <= 0:
+                break
+
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+
+        for task in pending:
+            name, tld = tasks[task]
+            yield LookupFailure(name, tld, LookupFailure.TIMEOUT)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class DomainResult(NamedTuple):
+    """
+    The answer of a lookup, as returned by the endpoints.
+
+    Attributes:
+        name (str): the domain name
+        tld (str): the tld of the domain
+        registered (bool): if the domain is registered
+    """
+
+    name: str
+    tld: str
+    registered: bool
+
+
+class LookupFailure(NamedTuple):
+    """
+    A lookup that didn't produce an answer.
+
+    Attributes:
+        name (str): the domain name
+        tld (str): the tld of the domain
+        reason (str): LookupFailure.TIMEOUT or LookupFailure.ERROR
     """
-    tlds = POPULAR_TLDS
-    if tld in tlds:
-        tlds.remove(tld)
 
-    names = set([name] + _similar_names(name))
+    name: str
+    tld: str
+    reason: str
 
-    whois_tasks = _create_whois_tasks(names, tlds=tlds)
-    results = await asyncio.gather(*whois_tasks, return_exceptions=True)
+    TIMEOUT = "timeout"
+    ERROR = "error"
 
-    results = _exclude_errors(results)
-    return _parse_results(results)
+    @classmethod
+    def from_exception(cls, name: str, tld: str, exc: Exception):
+        """Returns the failure of a lookup that raised `exc`."""
+        if isinstance(exc, asyncio.TimeoutError):
+            return cls(name, tld, cls.TIMEOUT)
+        return cls(name, tld, cls.ERROR)
 
 
 async def _structured_whois(name, tld):
-    return (name, tld, await whois_query(name, tld))
+    try:
+        return DomainResult(name, tld, await whois_query(name, tld))
+    except Exception as exc:  # pylint: disable=broad-except
+        return LookupFailure.from_exception(name, tld, exc)
 
 
 def split_domain_name(domain_name: str) -> tuple:
@@ -79,49 +331,24 @@ def split_domain_name(domain_name: str) -> tuple:
     return (full_domain, "com")
 
 
-def _parse_results(results: list) -> List[Domain]:
-    parsed = []
-    for name, tld, registered in results:
-        parsed.append(Domain(name=name, tld=tld, registered=registered))
-    return parsed
-
-
-def _create_whois_tasks(domain_names: set, tlds: list) -> List:
-    tasks = []
+def _create_whois_tasks(domain_names: set, tlds: list) -> Dict[asyncio.Task, tuple]:
+    tasks = {}
     for name in domain_names:
         for tld in tlds:
             task = asyncio.create_task(_structured_whois(name, tld))
-            tasks.append(task)
+            tasks[task] = (name, tld)
     return tasks
 
 
-def _exclude_errors(results: list) -> List[tuple]:
-    return [p for p in results if isinstance(p, tuple)]
-
-
-def _similar_names(domain_name: str) -> List[str]:
-    similar = []
-
-    api_base = "https://api.datamuse.com"
-    endpoints = {"/words?sp=", "/words?sl=", "/words?ml=", "/words?rel_trg=cow"}
-
-    for endpoint in endpoints:
-        url = api_base + endpoint + domain_name
-        resp = requests.get(url)
-        if resp.status_code != 200 or not resp.json():
-            continue
-
-        words = resp.json()[0:3]
-
-        for word in words:
-            if word["word"] != domain_name:
-                domain = "".join(word["word"].split())
-
-                try:
-                    domain_name_validator(domain)
-                except ValidationError:
-                    continue
-
-                similar.append(domain)
+async def _similar_names(domain_name: str, limit: int = None) -> List[str]:
+    if get_setting("SIMILAR_NAMES_SOURCE") == "local":
+        if limit is None:
+            limit = get_setting("CANDIDATES_MAX")
+        return candidates.similar_names(domain_name, limit)
 
-    return similar
+    names = [
+        "".join(word.split())
+        for word in await datamuse.suggestions(domain_name)
+        if word != domain_name
+    ]
+    return [name for name in names if is_valid_name(name)]
@@ -0,0 +1,84 @@
+"""Search history of the users"""
+import datetime
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .conf import get_setting
+from .models import SearchHistory
+from .writer import BatchWriter
+
+
+def record(user, domain: str):
+    """
+    Queues a search of `domain` by `user` to be added to their history.
+
+    Note:
+        Nothing is written on the request path, searches are inserted in
+        batches by a BatchWriter.
+    """
+    get_history_writer().add(
+        SearchHistory(user_id=user.pk, domain=domain, searched_at=timezone.now())
+    )
+
+
+def page(user, before: int = None, size: int = None) -> Tuple[List[str], Optional[int]]:
+    """
+    Reads a page of the history of `user`, most recent first.
+
+    Args:
+        user (User): the user
+        before (int): the cursor returned with the previous page, None for
+            the first page
+        size (int): the most searches returned, HISTORY_PAGE_SIZE by default
+
+    Returns:
+        (domains, next): the domains searched, and the cursor of the next
+        page or None if this is the last one.
+
+    Note:
+        Only the searches waiting in this process are written first, those
+        recorded by other workers show up once their writer flushed them,
+        within HISTORY_FLUSH_INTERVAL seconds.
+    """
+    # the user may be reading what they just searched
+    try:
+        get_history_writer().flush()
+    except DatabaseError:
+        # logged by the writer, what was written is still worth reading
+        pass
+
+    size = size or get_setting("HISTORY_PAGE_SIZE")
+    searches = SearchHistory.objects.filter(user=user)
+    if before is not None:
+        searches = searches.filter(id__lt=before)
+    rows = list(searches.order_by("-id").values_list("id", "domain")[: size + 1])
+
+    next_cursor = rows[size - 1][0] if len(rows) > size else None
+    return [domain for _, domain in rows[:size]], next_cursor
+
+
+def prune(retention_days: int) -> int:
+    """
+    Deletes the searches older than `retention_days` days.
+
+    Returns:
+        The number of searches deleted.
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=retention_days)
+    deleted, _ = SearchHistory.objects.filter(searched_at__lt=cutoff).delete()
+    return deleted
+
+
+@lru_cache(maxsize=None)
+def get_history_writer() -> BatchWriter:
+    """
+    Returns the process wide writer of search history.
+    """
+    return BatchWriter(
+        SearchHistory.objects.bulk_create,
+        get_setting("HISTORY_BATCH_SIZE"),
+        get_setting("HISTORY_FLUSH_INTERVAL"),
+    )
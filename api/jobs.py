@@ -0,0 +1,147 @@
+"""Searches for similar domains run by background worker processes"""
+import asyncio
+import datetime
+import logging
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import engine
+from .conf import get_setting
+from .models import SearchJob, SearchJobResult, User
+from .writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+
+def submit(user: User, name: str, tld: str, tlds: List[str]) -> SearchJob:
+    """
+    Queues a search for domains similar to `name`.`tld`.
+
+    Args:
+        user (User): the user submitting it, the only one who can read it
+        name (str): the domain name to find similar names to
+        tld (str): the tld of the domain
+        tlds (List[str]): the tlds every similar name is looked up in
+
+    Returns:
+        The pending SearchJob.
+    """
+    return SearchJob.objects.create(user=user, name=name, tld=tld, tlds=tlds)
+
+
+def claim() -> Optional[SearchJob]:
+    """
+    Marks the oldest pending job running and returns it.
+
+    Jobs still running long after their deadline were abandoned by a worker
+    that died, they're claimed again and their results are dropped.
+
+    Returns:
+        The claimed SearchJob, or None if there's nothing to do.
+    """
+    now = timezone.now()
+    abandoned_before = now - datetime.timedelta(seconds=2 * get_setting("JOB_DEADLINE"))
+
+    with transaction.atomic():
+        job = (
+            SearchJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=SearchJob.PENDING)
+                | Q(status=SearchJob.RUNNING, started_at__lt=abandoned_before)
+            )
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.results.all().delete()
+        job.status = SearchJob.RUNNING
+        job.started_at = now
+        job.save(update_fields=["status", "started_at"])
+    return job
+
+
+async def run(job: SearchJob):
+    """
+    Runs a claimed job, its results are queued to be written as they're found.
+    """
+    writer = _result_writer()
+    similar_domains = engine.iter_similar_domains(
+        job.name,
+        job.tld,
+        deadline=get_setting("JOB_DEADLINE"),
+        tlds=list(job.tlds),
+        max_names=get_setting("JOB_CANDIDATES_MAX"),
+    )
+    async for similar in similar_domains:
+        if isinstance(similar, engine.LookupFailure):
+            result = SearchJobResult(
+                job=job, name=similar.name, tld=similar.tld, failure=similar.reason
+            )
+        else:
+            result = SearchJobResult(
+                job=job,
+                name=similar.name,
+                tld=similar.tld,
+                registered=similar.registered,
+            )
+        writer.add(result)
+
+
+def work(max_jobs: int = None):
+    """
+    Claims and runs jobs one after the other, waiting for new ones when idle.
+
+    Args:
+        max_jobs (int): stop after this many jobs, never by default
+    """
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        job = claim()
+        if job is None:
+            time.sleep(get_setting("JOB_POLL_INTERVAL"))
+            continue
+
+        try:
+            try:
+                asyncio.run(run(job))
+            finally:
+                # clients stop reading results once the job is finished, and
+                # a job whose results weren't all written failed
+                _result_writer().flush()
+            job.status = SearchJob.DONE
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Search job %s failed", job.id)
+            job.status = SearchJob.FAILED
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "finished_at"])
+        done += 1
+
+
+def results_after(job: SearchJob, after: int, limit: int) -> List[SearchJobResult]:
+    """
+    Returns the results of a job, in the order they were found.
+
+    Args:
+        job (SearchJob): the job
+        after (int): only results whose id is greater, 0 for all
+        limit (int): the most results returned
+    """
+    return list(job.results.filter(id__gt=after).order_by("id")[:limit])
+
+
+@lru_cache(maxsize=None)
+def _result_writer() -> BatchWriter:
+    # one per worker process, flushed at the end of every job
+    return BatchWriter(
+        SearchJobResult.objects.bulk_create,
+        get_setting("JOB_RESULTS_BATCH_SIZE"),
+        get_setting("JOB_POLL_INTERVAL"),
+    )
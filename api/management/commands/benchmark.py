@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import (
+    SCENARIOS,
+    FakeDatamuseServer,
+    FakeWhoisServer,
+    compare,
+    run,
+)
+from api.conf import get_setting
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests the engine and the views against a local fake WHOIS server "
+        "and a fake Datamuse, and compares the results to a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=sorted(SCENARIOS),
+            help="scenario to run, can be repeated (all by default)",
+        )
+        parser.add_argument("--requests", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--names-source",
+            choices=("local", "datamuse"),
+            default=get_setting("SIMILAR_NAMES_SOURCE"),
+        )
+        parser.add_argument("--whois-latency", type=float, default=0.05)
+        parser.add_argument("--whois-jitter", type=float, default=0.02)
+        parser.add_argument("--whois-error-rate", type=float, default=0.0)
+        parser.add_argument(
+            "--whois-rate",
+            type=float,
+            default=None,
+            help="queries per second the fake WHOIS server answers",
+        )
+        parser.add_argument(
+            "--registered",
+            type=float,
+            default=0.5,
+            help="share of the domains that are registered",
+        )
+        parser.add_argument("--datamuse-latency", type=float, default=0.02)
+        parser.add_argument("--output", help="write the report as JSON")
+        parser.add_argument("--compare", help="baseline report to compare with")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="relative change from the baseline reported as a regression",
+        )
+
+    def handle(self, *args, **options):
+        config = {
+            key: options[key]
+            for key in (
+                "requests",
+                "concurrency",
+                "seed",
+                "names_source",
+                "whois_latency",
+                "whois_jitter",
+                "whois_error_rate",
+                "whois_rate",
+                "registered",
+                "datamuse_latency",
+            )
+        }
+        whois = FakeWhoisServer(
+            latency=options["whois_latency"],
+            jitter=options["whois_jitter"],
+            error_rate=options["whois_error_rate"],
+            rate=options["whois_rate"],
+            registered=options["registered"],
+            seed=options["seed"],
+        )
+        datamuse_server = FakeDatamuseServer(
+            latency=options["datamuse_latency"], seed=options["seed"]
+        )
+        scenarios = asyncio.run(
+            run(
+                options["scenario"] or list(SCENARIOS),
+                options["requests"],
+                options["concurrency"],
+                whois,
+                datamuse_server,
+                seed=options["seed"],
+                overrides={"SIMILAR_NAMES_SOURCE": options["names_source"]},
+            )
+        )
+        report = {"config": config, "scenarios": scenarios}
+
+        for scenario, result in scenarios.items():
+            self.stdout.write(
+                f"{scenario}: {result['throughput']:.1f} req/s, "
+                f"p50 {result['p50']:.1f} ms, p95 {result['p95']:.1f} ms, "
+                f"p99 {result['p99']:.1f} ms, {result['errors']} errors, "
+                f"{result['whois_queries']} WHOIS queries "
+                f"({result['whois_errors']} failed, "
+                f"{result['whois_throttled']} throttled), "
+                f"{result['datamuse_requests']} Datamuse requests"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(report, output, indent=2)
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+            if baseline.get("config") != config:
+                self.stderr.write(
+                    "The baseline was run with another configuration: "
+                    f"{baseline.get('config')}"
+                )
+            regressions = compare(baseline, report, options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    "Regressions from the baseline:\n" + "\n".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("No regression from the baseline"))
@@ -0,0 +1,58 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.serializers import DomainSerializer
+from api.validators import (
+    domain_name_validator,
+    domain_tld_validator,
+    get_supported_tlds,
+    validate_domains,
+)
+
+
+class Command(BaseCommand):
+    help = "Measures the per-name cost of validating domains"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--names", type=int, default=100_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        alphabet = string.ascii_lowercase + string.digits + "-_"
+        tlds = sorted(get_supported_tlds())
+        domains = [
+            (
+                "".join(rng.choices(alphabet, k=rng.randint(2, 20))),
+                rng.choice(tlds),
+            )
+            for _ in range(options["names"])
+        ]
+
+        def one_by_one():
+            for name, tld in domains:
+                try:
+                    domain_name_validator(name)
+                    domain_tld_validator(tld)
+                except Exception:  # pylint: disable=broad-except
+                    pass
+
+        def serializers():
+            for name, tld in domains:
+                DomainSerializer(data={"name": name, "tld": tld}).is_valid()
+
+        for label, run in (
+            ("DomainSerializer, one by one", serializers),
+            ("field validators, one by one", one_by_one),
+            ("validate_domains, in bulk", lambda: validate_domains(domains)),
+        ):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{label}: {elapsed * 1e9 / len(domains):.0f} ns/name "
+                f"({len(domains)} names in {elapsed:.3f} s)"
+            )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.candidates import BUNDLED_INDEX, BUNDLED_WORDS, WordIndex, read_words
+from api.conf import get_setting
+
+
+class Command(BaseCommand):
+    help = "Builds the word index of the local similar name generator"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "words",
+            nargs="?",
+            default=str(BUNDLED_WORDS),
+            help="newline delimited word list, defaults to the bundled one",
+        )
+        parser.add_argument(
+            "--width",
+            type=int,
+            default=16,
+            help="bytes per record, longer words are left out",
+        )
+
+    def handle(self, *args, **options):
+        path = get_setting("CANDIDATES_INDEX") or BUNDLED_INDEX
+        try:
+            count = WordIndex.build(
+                read_words(options["words"]), path, options["width"]
+            )
+        except OSError as exc:
+            raise CommandError(f"Couldn't build the index: {exc}") from exc
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} words in {path}"))
@@ -0,0 +1,79 @@
+import gzip
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.zones import ZoneIndex, index_path, zone_names
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds the names of zone files (or any list of registered domains) to "
+        "the zone index of a TLD, creating it if needed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("tld")
+        parser.add_argument(
+            "dumps",
+            nargs="+",
+            help="zone files or newline delimited domains, optionally gzipped",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="start from an empty index instead of adding to the existing one",
+        )
+        parser.add_argument(
+            "--capacity",
+            type=int,
+            help="names the new index is sized for, those of the dumps by default",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.001,
+            help="share of the unregistered names a new index reports registered",
+        )
+
+    def handle(self, *args, **options):
+        tld = options["tld"].lower().lstrip(".")
+        path = index_path(tld)
+        if path is None:
+            raise CommandError("Set ZONE_INDEX_DIR to build zone indexes")
+
+        try:
+            if options["rebuild"] or not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                capacity = options["capacity"] or self._count(options["dumps"], tld)
+                index = ZoneIndex.create(path, capacity, options["error_rate"])
+            else:
+                index = ZoneIndex(path, writable=True)
+
+            with ExitStack() as stack:
+                for dump in options["dumps"]:
+                    added = index.add(zone_names(stack.enter_context(_open(dump)), tld))
+                    self.stdout.write(f"{dump}: {added} names")
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Couldn't build the index: {exc}") from exc
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{index.count} names in {path}, "
+                f"expected error rate {index.error_rate():.2%}"
+            )
+        )
+
+    @staticmethod
+    def _count(dumps, tld) -> int:
+        count = 0
+        for dump in dumps:
+            with _open(dump) as lines:
+                count += sum(1 for _ in zone_names(lines, tld))
+        return count
+
+
+def _open(dump: str):
+    if dump.endswith(".gz"):
+        return gzip.open(dump, "rt", encoding="utf-8", errors="replace")
+    return open(dump, encoding="utf-8", errors="replace")
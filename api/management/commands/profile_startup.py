@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.startup import LAZY_MODULES, PHASES, packages, profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts a fresh process of the app (domain_finder.asgi) and reports how "
+        "long it took to boot, start up and serve its first request, and what "
+        "it imported"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default="/metrics",
+            help="path of the first request, it shouldn't need the database",
+        )
+        parser.add_argument(
+            "--top", type=int, default=10, help="imports listed per phase"
+        )
+        parser.add_argument(
+            "--modules",
+            action="store_true",
+            help="list modules instead of summing them per package",
+        )
+        parser.add_argument(
+            "--no-warm-up",
+            action="store_true",
+            help="start up without warming up, as with WARMUP_ON_STARTUP off",
+        )
+        parser.add_argument(
+            "--budget",
+            type=float,
+            help="fail if booting, starting up and serving the first request take longer (ms)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            report = profile(options["path"], warm_up=not options["no_warm_up"])
+        except RuntimeError as exc:
+            raise CommandError(str(exc)) from exc
+
+        for phase in PHASES:
+            imports = report[phase]["imports"]
+            self.stdout.write(
+                f"{phase}: {report[phase]['seconds'] * 1000:.0f} ms, "
+                f"{sum(imports.values()) / 1000:.0f} ms importing "
+                f"{len(imports)} modules"
+            )
+            if options["modules"]:
+                slowest = sorted(imports.items(), key=lambda i: i[1], reverse=True)
+            else:
+                slowest = packages(imports)
+            for name, micros in slowest[: options["top"]]:
+                self.stdout.write(f"  {micros / 1000:8.1f} ms  {name}")
+
+            lazy = sorted(
+                {module.split(".")[0] for module in imports} & set(LAZY_MODULES)
+            )
+            # the warm up loads them on purpose
+            if lazy and phase != "startup":
+                self.stderr.write(f"  loaded lazy modules: {', '.join(lazy)}")
+
+        cold_start = sum(report[phase]["seconds"] for phase in PHASES) * 1000
+        self.stdout.write(
+            f"first request answered {report['status']} after {cold_start:.0f} ms "
+            f"({report['process'] * 1000:.0f} ms with the interpreter)"
+        )
+        if options["budget"] is not None and cold_start > options["budget"]:
+            raise CommandError(
+                f"Cold start took {cold_start:.0f} ms, over the "
+                f"{options['budget']:.0f} ms budget"
+            )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api import history
+from api.conf import get_setting
+
+
+class Command(BaseCommand):
+    help = "Deletes the search history older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=get_setting("HISTORY_RETENTION_DAYS"),
+            help="days searches are kept",
+        )
+
+    def handle(self, *args, **options):
+        deleted = history.prune(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} searches"))
@@ -0,0 +1,90 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from api import engine
+from api.conf import get_setting
+from api.store import get_lookup_store, stale_results
+
+
+class Command(BaseCommand):
+    help = "Looks up again the stored answers that are stale or about to expire"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--expiring-within",
+            type=int,
+            default=get_setting("STORE_REFRESH_EXPIRING_DAYS"),
+            help="days before a registration expires from which it's checked",
+        )
+        parser.add_argument(
+            "--limit", type=int, help="the most answers refreshed in this run"
+        )
+
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=get_setting("STORE_REFRESH_CONCURRENCY"),
+            help="lookups in flight at once",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=get_setting("STORE_BATCH_SIZE"),
+            help="stale answers read from the database at once",
+        )
+
+    def handle(self, *args, **options):
+        if not get_setting("LOOKUP_STORE"):
+            raise CommandError("There are no stored answers without LOOKUP_STORE")
+
+        refreshed, failed = asyncio.run(self._refresh_all(options))
+        # answers are written in batches, make sure the last one is
+        get_lookup_store().flush()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Refreshed {refreshed} answers, {failed} failed")
+        )
+
+    async def _refresh_all(self, options: dict) -> tuple:
+        stale = stale_results(options["expiring_within"]).order_by("checked_at", "pk")
+        limit = options["limit"]
+        refreshed = failed = 0
+        after = None
+        while limit is None or refreshed + failed < limit:
+            chunk = options["chunk_size"]
+            if limit is not None:
+                chunk = min(chunk, limit - refreshed - failed)
+            # pages by the last answer read, refreshed ones aren't stale anymore
+            # but the failed ones still are
+            page = stale if after is None else stale.filter(after)
+            rows = await sync_to_async(list)(
+                page.values_list("name", "tld", "checked_at", "pk")[:chunk]
+            )
+            if not rows:
+                break
+
+            done = await self._refresh(
+                [(name, tld) for name, tld, _, _ in rows], options["concurrency"]
+            )
+            refreshed += done[0]
+            failed += done[1]
+            *_, checked_at, pk = rows[-1]
+            after = Q(checked_at__gt=checked_at) | Q(checked_at=checked_at, pk__gt=pk)
+        return refreshed, failed
+
+    async def _refresh(self, domains: list, concurrency: int) -> tuple:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def refresh(name, tld):
+            async with semaphore:
+                try:
+                    await engine.refresh(name, tld)
+                    return True
+                except Exception:  # pylint: disable=broad-except
+                    return False
+
+        results = await asyncio.gather(*(refresh(name, tld) for name, tld in domains))
+        return results.count(True), results.count(False)
@@ -0,0 +1,41 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import jobs
+from api.conf import get_setting
+
+
+class Command(BaseCommand):
+    help = "Runs the worker processes of similar domain search jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=get_setting("JOB_WORKERS"),
+            help="worker processes, each runs one job at a time",
+        )
+
+    def handle(self, *args, **options):
+        if options["processes"] == 1:
+            jobs.work()
+            return
+
+        # forked processes mustn't share the parent's connections
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=jobs.work, name=f"search-worker-{i}")
+            for i in range(options["processes"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} search workers")
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
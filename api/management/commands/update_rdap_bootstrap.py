@@ -0,0 +1,34 @@
+import json
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+from api.backends import BUNDLED_RDAP_BOOTSTRAP
+from api.conf import get_setting
+
+IANA_RDAP_BOOTSTRAP = "https://data.iana.org/rdap/dns.json"
+
+
+class Command(BaseCommand):
+    help = "Downloads the RDAP bootstrap file for domains from IANA"
+
+    def handle(self, *args, **options):
+        try:
+            resp = httpx.get(IANA_RDAP_BOOTSTRAP, timeout=30)
+            resp.raise_for_status()
+            bootstrap = resp.json()
+        except (httpx.HTTPError, ValueError) as exc:
+            raise CommandError(f"Couldn't download the bootstrap file: {exc}") from exc
+
+        if not bootstrap.get("services"):
+            raise CommandError("The bootstrap file lists no services")
+
+        path = get_setting("RDAP_BOOTSTRAP_FILE") or BUNDLED_RDAP_BOOTSTRAP
+        with open(path, "w", encoding="utf-8") as bootstrap_file:
+            json.dump(bootstrap, bootstrap_file, indent=2)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Saved RDAP servers of {len(bootstrap['services'])} TLD groups to {path}"
+            )
+        )
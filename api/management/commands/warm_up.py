@@ -0,0 +1,50 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.conf import get_setting
+from api.store import get_lookup_store
+from api.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Looks the hot names up in the similar TLDs, to fill the shared caches "
+        "and the lookup store before traffic comes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help="names to look up, WARMUP_NAMES and the most searched by default",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=get_setting("WARMUP_CONCURRENCY"),
+            help="lookups in flight at once",
+        )
+
+    def handle(self, *args, **options):
+        if not any(
+            get_setting(name)
+            for name in ("CACHE_ALIAS", "SHARED_STATE_DIR", "LOOKUP_STORE")
+        ):
+            raise CommandError(
+                "Nothing outlives this command without CACHE_ALIAS, "
+                "SHARED_STATE_DIR or LOOKUP_STORE, workers warm themselves up"
+            )
+
+        warmed = asyncio.run(warm_up(options["names"] or None, options["concurrency"]))
+        # answers are written in batches, make sure the last one is
+        if get_setting("LOOKUP_STORE"):
+            get_lookup_store().flush()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Warmed up {warmed['tlds']} TLDs and {warmed['names']} names: "
+                f"{warmed['lookups']} lookups, {warmed['failed']} failed, "
+                f"in {warmed['seconds']:.1f} s"
+            )
+        )
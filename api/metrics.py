@@ -0,0 +1,370 @@
+"""Counters, gauges and histograms of the lookup pipeline, in Prometheus format"""
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Dict, List, Tuple
+
+from .conf import get_setting
+
+logger = logging.getLogger(__name__)
+
+# seconds, like the default buckets of the Prometheus clients with a few more
+# for slow registries
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# stage -> seconds spent in it by the current request, see start_timing
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+class Metric:
+    """
+    Base class of the metrics, a value per combination of labels.
+
+    Attributes:
+        name (str): the name of the metric
+        documentation (str): what the metric measures
+        labelnames (Tuple[str]): the labels every value is recorded with
+    """
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple, **extra) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(v)}"' for name, v in pairs) + "}"
+
+    def snapshot(self) -> dict:
+        """Returns a copy of the values of the metric, by label values."""
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, values: dict, other: dict):
+        """Adds the values of `other`, e.g. of another process, to `values`."""
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def samples(self, values: dict = None) -> List[str]:
+        """Returns the lines of the metric's values, or of `values`."""
+        if values is None:
+            values = self.snapshot()
+        return [
+            f"{self.name}{self._labels(key)} {value}"
+            for key, value in sorted(values.items())
+        ]
+
+    def render(self, values: dict = None) -> str:
+        """Returns the metric in the Prometheus text format."""
+        return "\n".join(
+            [
+                f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}",
+                *self.samples(values),
+            ]
+        )
+
+
+class Counter(Metric):
+    """A value that only goes up"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        """Adds `amount` to the value of `labels`."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _start_export(os.getpid())
+
+
+class Gauge(Metric):
+    """A value that goes up and down"""
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        """Adds `amount` to the value of `labels`."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _start_export(os.getpid())
+
+    def dec(self, amount: float = 1, **labels):
+        """Subtracts `amount` from the value of `labels`."""
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Counts the code running in the block, e.g. requests in flight."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    """
+    Counts observations, e.g. latencies, in cumulative buckets.
+
+    Attributes:
+        buckets (Tuple[float]): the upper bounds of the buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """Records an observation of `value`."""
+        key = self._key(labels)
+        with self._lock:
+            buckets, count, total = self._values.get(
+                key, ((0,) * len(self.buckets), 0, 0.0)
+            )
+            # a new tuple, snapshots share the old one
+            buckets = tuple(
+                in_bucket + (value <= bound)
+                for in_bucket, bound in zip(buckets, self.buckets)
+            )
+            self._values[key] = (buckets, count + 1, total + value)
+        _start_export(os.getpid())
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the seconds the block takes."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, values: dict, other: dict):
+        for key, (buckets, count, total) in other.items():
+            mine = values.get(key, ((0,) * len(self.buckets), 0, 0.0))
+            values[key] = (
+                tuple(a + b for a, b in zip(mine[0], buckets)),
+                mine[1] + count,
+                mine[2] + total,
+            )
+
+    def samples(self, values: dict = None) -> List[str]:
+        if values is None:
+            values = self.snapshot()
+        lines = []
+        for key, (buckets, count, total) in sorted(values.items()):
+            for bound, in_bucket in zip(self.buckets, buckets):
+                lines.append(
+                    f"{self.name}_bucket{self._labels(key, le=bound)} {in_bucket}"
+                )
+            lines.append(f"{self.name}_bucket{self._labels(key, le='+Inf')} {count}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+
+
+def render() -> str:
+    """
+    Returns every metric in the Prometheus text format.
+
+    With SHARED_STATE_DIR, these are the sums of the metrics of every live
+    process of the host, as of their last export (see `export`), and of this
+    process now.
+    """
+    directory = get_setting("SHARED_STATE_DIR")
+    if directory is None:
+        return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+    directory = Path(directory) / "metrics"
+    export(directory)
+    totals = {metric.name: {} for metric in REGISTRY}
+    for snapshot in _live_snapshots(directory):
+        for metric in REGISTRY:
+            metric.merge(totals[metric.name], snapshot.get(metric.name, {}))
+    return "\n".join(metric.render(totals[metric.name]) for metric in REGISTRY) + "\n"
+
+
+def export(directory: Path):
+    """
+    Writes the metrics of this process to `directory`, where `render` reads
+    the metrics of every process of the host.
+    """
+    snapshot = {
+        metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+        for metric in REGISTRY
+    }
+    directory.mkdir(parents=True, exist_ok=True)
+    # a file per export, render() and the export thread may write at once
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, prefix=f".{os.getpid()}.", suffix=".tmp", delete=False
+    ) as partial:
+        try:
+            json.dump(snapshot, partial)
+        except BaseException:
+            os.unlink(partial.name)
+            raise
+    # readers see the previous snapshot or this one, never a partial one
+    os.replace(partial.name, directory / f"{os.getpid()}.json")
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Observes the seconds the block takes as a stage of the request, and adds
+    them to the timing breakdown of the request if one was started.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0) + elapsed
+
+
+def start_timing() -> Dict[str, float]:
+    """
+    Starts collecting the time spent in every stage of the current request.
+
+    Returns:
+        The dict the stages are added to, render it with `server_timing`.
+    """
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Formats the stages of a request as a Server-Timing header."""
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()
+    )
+
+
+@lru_cache(maxsize=None)
+def _start_export(pid: int) -> bool:
+    # once per process, a forked worker doesn't inherit the thread
+    directory = get_setting("SHARED_STATE_DIR")
+    if directory is None:
+        return False
+    Thread(
+        target=_export_periodically,
+        args=(Path(directory) / "metrics", get_setting("METRICS_EXPORT_INTERVAL")),
+        name="metrics-export",
+        daemon=True,
+    ).start()
+    return True
+
+
+def _export_periodically(directory: Path, interval: float):
+    while True:
+        try:
+            export(directory)
+        except OSError:
+            logger.exception("Couldn't export the metrics to %s", directory)
+        time.sleep(interval)
+
+
+def _live_snapshots(directory: Path) -> List[Dict[str, dict]]:
+    snapshots = []
+    for path in directory.glob("*.json"):
+        try:
+            os.kill(int(path.stem), 0)
+        except ProcessLookupError:
+            # the gauges of a dead process are wrong, its counters are dropped
+            # too and the scraper sees them reset
+            path.unlink(missing_ok=True)
+            continue
+        except PermissionError:
+            pass  # alive, run by another user
+        except ValueError:
+            continue
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        snapshots.append(
+            {
+                name: {tuple(key): _values(value) for key, value in values}
+                for name, values in snapshot.items()
+            }
+        )
+    return snapshots
+
+
+def _values(value):
+    # histograms are exported as [buckets, count, sum]
+    if isinstance(value, list):
+        return tuple(value[0]), value[1], value[2]
+    return value
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+STAGE_DURATION = Histogram(
+    "domain_finder_stage_seconds",
+    "Seconds spent in every stage of the API requests",
+    ["stage"],
+)
+LOOKUP_DURATION = Histogram(
+    "domain_finder_lookup_seconds",
+    "Seconds a single lookup took, without the time waiting for the scheduler",
+    ["tld", "server"],
+)
+LOOKUP_ERRORS = Counter(
+    "domain_finder_lookup_errors_total",
+    "Lookups that failed after every retry, by exception type",
+    ["tld", "server", "error"],
+)
+LOOKUP_RETRIES = Counter(
+    "domain_finder_lookup_retries_total",
+    "Lookups retried after a transient error",
+    ["server"],
+)
+LOOKUP_HEDGES = Counter(
+    "domain_finder_lookup_hedges_total",
+    "Second lookups sent because the first was slow",
+    ["server"],
+)
+LOOKUPS_IN_FLIGHT = Gauge(
+    "domain_finder_lookups_in_flight",
+    "Lookups holding a slot of the scheduler",
+    ["server"],
+)
+CACHE_REQUESTS = Counter(
+    "domain_finder_cache_requests_total",
+    "Reads of the caches (result, store, datamuse, response) by result (hit, miss)",
+    ["cache", "result"],
+)
+DATAMUSE_DURATION = Histogram(
+    "domain_finder_datamuse_seconds",
+    "Seconds a request to an endpoint of Datamuse took",
+    ["endpoint"],
+)
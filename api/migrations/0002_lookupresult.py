@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LookupResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=63)),
+                ("tld", models.CharField(max_length=63)),
+                ("registered", models.BooleanField()),
+                ("checked_at", models.DateTimeField()),
+                ("source", models.CharField(max_length=16)),
+                ("expires_on", models.DateField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["checked_at"], name="api_lookupr_checked_5a4d00_idx"
+                    ),
+                    models.Index(
+                        fields=["expires_on"], name="api_lookupr_expires_593c78_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="lookupresult",
+            constraint=models.UniqueConstraint(
+                fields=("name", "tld"), name="unique_lookup"
+            ),
+        ),
+    ]
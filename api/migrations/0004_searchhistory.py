@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:59
+
+from django.conf import settings
+from django.db import migrations, models
+import datetime
+
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def copy_history(apps, schema_editor):
+    User = apps.get_model("api", "User")
+    SearchHistory = apps.get_model("api", "SearchHistory")
+
+    # the array kept no dates, only the order of the searches: the last one
+    # is dated now and every other a second before the next
+    now = timezone.now()
+    second = datetime.timedelta(seconds=1)
+    for user in User.objects.exclude(history=[]).only("id", "history").iterator():
+        count = len(user.history)
+        SearchHistory.objects.bulk_create(
+            SearchHistory(
+                user_id=user.id,
+                domain=domain,
+                searched_at=now - (count - 1 - position) * second,
+            )
+            for position, domain in enumerate(user.history)
+        )
+
+
+def copy_history_back(apps, schema_editor):
+    User = apps.get_model("api", "User")
+    SearchHistory = apps.get_model("api", "SearchHistory")
+
+    for user in User.objects.filter(searches__isnull=False).distinct().iterator():
+        user.history = list(
+            SearchHistory.objects.filter(user_id=user.id)
+            .order_by("id")
+            .values_list("domain", flat=True)
+        )
+        user.save(update_fields=["history"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_searchjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("domain", models.CharField(max_length=255)),
+                ("searched_at", models.DateTimeField(db_index=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="searches",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-id"], name="api_searchh_user_id_e31ea1_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(copy_history, copy_history_back),
+        migrations.RemoveField(
+            model_name="user",
+            name="history",
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_searchhistory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="searchjob",
+            name="user",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="search_jobs",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.core.validators import MinLengthValidator
 from django.contrib.postgres import fields
@@ -28,18 +30,121 @@ class Domain(models.Model):
     registered = models.BooleanField(default=False)
 
 
+class LookupResult(models.Model):
+    """
+    The last answer of a lookup, kept to answer repeated lookups of a domain.
+
+    Attributes:
+        name (str): The name of the domain, lowercased
+        tld (str): The top-level-domain name, lowercased
+        registered (bool): If the domain was registered
+        checked_at (datetime): When the lookup was done
+        source (str): What answered the lookup, e.g. "whois", "rdap" or "dns"
+        expires_on (date): When the registration expires, if known
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["name", "tld"], name="unique_lookup")
+        ]
+        indexes = [
+            models.Index(fields=["checked_at"]),
+            models.Index(fields=["expires_on"]),
+        ]
+
+    name = models.CharField(max_length=63)
+    tld = models.CharField(max_length=63)
+    registered = models.BooleanField()
+    checked_at = models.DateTimeField()
+    source = models.CharField(max_length=16)
+    expires_on = models.DateField(null=True, blank=True)
+
+
+class SearchJob(models.Model):
+    """
+    A search for similar domains run by the background workers.
+
+    Attributes:
+        id (UUID): The id handed to the client
+        user (User): The user who submitted it, the only one who can read it
+            (None for jobs submitted before jobs had owners)
+        name (str): The name of the domain to find similars to
+        tld (str): The top-level-domain name
+        tlds (List[str]): The TLDs every similar name is looked up in
+        status (str): One of PENDING, RUNNING, DONE or FAILED
+        created_at (datetime): When the job was submitted
+        started_at (datetime): When a worker claimed the job
+        finished_at (datetime): When the job finished
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [(status, status) for status in (PENDING, RUNNING, DONE, FAILED)]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        "User", on_delete=models.CASCADE, related_name="search_jobs", null=True
+    )
+    name = models.CharField(max_length=63)
+    tld = models.CharField(max_length=63)
+    tlds = fields.ArrayField(base_field=models.CharField(max_length=63))
+    status = models.CharField(
+        max_length=8, choices=STATUSES, default=PENDING, db_index=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class SearchJobResult(models.Model):
+    """
+    A similar domain found by a SearchJob, or one that couldn't be looked up.
+
+    Attributes:
+        job (SearchJob): The job that found it
+        name (str): The name of the domain
+        tld (str): The top-level-domain name
+        registered (bool): If the domain is registered, None if the lookup failed
+        failure (str): Why the lookup failed, see engine.LookupFailure
+    """
+
+    job = models.ForeignKey(SearchJob, on_delete=models.CASCADE, related_name="results")
+    name = models.CharField(max_length=63)
+    tld = models.CharField(max_length=63)
+    registered = models.BooleanField(null=True)
+    failure = models.CharField(max_length=16, blank=True)
+
+
 class User(AbstractUser):
     """
     Custom user model.
 
     Attributes:
         email (str): Email of the user
-        history (List[str]): User search historyt
+        searches (QuerySet): User search history, see SearchHistory
     """
 
     email = models.EmailField(unique=True, blank=False)
-    history = fields.ArrayField(
-        base_field=models.CharField(max_length=255), default=list
-    )
 
-    REQUIRED_FIELDS = ["email", "history"]
+    REQUIRED_FIELDS = ["email"]
+
+
+class SearchHistory(models.Model):
+    """
+    A domain a user looked up. Rows are only ever added, and pruned once
+    they're older than HISTORY_RETENTION_DAYS.
+
+    Attributes:
+        user (User): The user who searched
+        domain (str): The domain searched
+        searched_at (datetime): When it was searched
+    """
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "-id"])]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="searches")
+    domain = models.CharField(max_length=255)
+    searched_at = models.DateTimeField(db_index=True)
@@ -0,0 +1,164 @@
+"""Timeouts, retries and hedging of lookups"""
+import asyncio
+import random
+import sys
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, Awaitable, Callable, Tuple
+
+from . import metrics
+from .conf import get_setting
+
+# errors worth another try, anything else is final, see `transient_errors`
+TRANSIENT_ERRORS = (OSError, asyncio.TimeoutError)
+
+
+class LatencyTracker:
+    """
+    Keeps the latencies of the most recent lookups per key.
+
+    Attributes:
+        size (int): the number of latencies kept per key
+    """
+
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._latencies = defaultdict(lambda: deque(maxlen=self.size))
+
+    def record(self, key: str, seconds: float):
+        """Records the latency of a lookup."""
+        self._latencies[key].append(seconds)
+
+    def quantile(self, key: str, q: float, min_samples: int = 1):
+        """
+        Returns the `q` quantile of the recorded latencies of `key`, or None
+        if fewer than `min_samples` were recorded.
+        """
+        latencies = self._latencies.get(key)
+        if not latencies or len(latencies) < min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+latencies = LatencyTracker()
+
+
+async def run(
+    attempt: Callable[[], Awaitable],
+    key: str,
+    slot: Callable[[], AsyncContextManager] = None,
+):
+    """
+    Runs a lookup with a timeout, retries on transient errors and hedging.
+
+    Args:
+        attempt (Callable): returns a new awaitable of the lookup every call
+        key (str): groups lookups whose latencies are comparable, e.g. by server
+        slot (Callable): returns a new context manager every attempt and
+            hedge is run in, e.g. a slot of the scheduler
+
+    Returns:
+        The result of the first successful attempt.
+
+    Raises:
+        The error of the last attempt if every attempt failed.
+
+    Note:
+        The timeout and the recorded latency of an attempt start once its
+        slot is entered, an attempt waiting for it is never timed out nor
+        hedged.
+    """
+    retries = get_setting("LOOKUP_RETRIES")
+    for retry in range(retries + 1):
+        try:
+            return await _hedged(attempt, key, slot or _no_slot)
+        except transient_errors():
+            if retry == retries:
+                raise
+            metrics.LOOKUP_RETRIES.inc(server=key)
+            # exponential backoff with full jitter
+            await asyncio.sleep(
+                random.uniform(0, get_setting("LOOKUP_BACKOFF") * 2**retry)
+            )
+
+
+def transient_errors() -> Tuple[type, ...]:
+    """
+    Returns the errors worth another try.
+
+    Note:
+        The transport errors of httpx are only added once a backend imported
+        it, none can be raised before, so that it isn't imported just for this.
+    """
+    httpx = sys.modules.get("httpx")
+    if httpx is None:
+        return TRANSIENT_ERRORS
+    return TRANSIENT_ERRORS + (httpx.TransportError,)
+
+
+async def _hedged(
+    attempt: Callable[[], Awaitable],
+    key: str,
+    slot: Callable[[], AsyncContextManager],
+):
+    hedge_after = None
+    if get_setting("LOOKUP_HEDGE"):
+        hedge_after = latencies.quantile(
+            key,
+            get_setting("LOOKUP_HEDGE_QUANTILE"),
+            min_samples=get_setting("LOOKUP_HEDGE_MIN_SAMPLES"),
+        )
+
+    sent = asyncio.Event()
+    first = asyncio.ensure_future(_timed(attempt, key, slot, sent))
+    tasks = {first}
+    try:
+        if hedge_after is not None:
+            # the first attempt is only slow once it's sent
+            waiting = asyncio.ensure_future(sent.wait())
+            try:
+                await asyncio.wait(
+                    {first, waiting}, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                waiting.cancel()
+
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                metrics.LOOKUP_HEDGES.inc(server=key)
+                tasks.add(
+                    asyncio.ensure_future(_timed(attempt, key, slot, asyncio.Event()))
+                )
+
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+
+        return first.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        first.cancel()
+
+
+async def _timed(
+    attempt: Callable[[], Awaitable],
+    key: str,
+    slot: Callable[[], AsyncContextManager],
+    sent: asyncio.Event,
+):
+    loop = asyncio.get_running_loop()
+    async with slot():
+        sent.set()
+        started = loop.time()
+        result = await asyncio.wait_for(attempt(), get_setting("LOOKUP_TIMEOUT"))
+    latencies.record(key, loop.time() - started)
+    return result
+
+
+@asynccontextmanager
+async def _no_slot():
+    yield
@@ -0,0 +1,45 @@
+"""Fast JSON encoding of the responses, with orjson if it's installed"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+
+    ORJSON = True
+except ImportError:
+    ORJSON = False
+
+# what orjson can't encode itself, e.g. lazy translations
+_default = JSONEncoder().default
+
+
+def dumps(data) -> str:
+    """
+    Encodes `data` as compact JSON, like json.dumps but faster with orjson.
+
+    Note:
+        Also encodes what DRF's JSONRenderer does (lazy strings, decimals...).
+    """
+    if ORJSON:
+        return orjson.dumps(data, default=_default).decode()
+    # the separators and characters orjson writes
+    return json.dumps(data, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson if it's installed.
+
+    Indented output (e.g. asked with `Accept: application/json; indent=4`)
+    is still rendered by JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if not ORJSON or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_default)
@@ -0,0 +1,215 @@
+"""Minimal async DNS client used to tell delegated domains apart without WHOIS"""
+import asyncio
+import random
+import struct
+from typing import List, Tuple
+
+from .conf import get_setting
+
+TYPE_A = 1
+TYPE_NS = 2
+TYPE_SOA = 6
+CLASS_IN = 1
+RCODE_NOERROR = 0
+
+DNS_PORT = 53
+
+# tld -> addresses of its authoritative nameservers
+_tld_nameservers = {}
+
+
+class DNSError(Exception):
+    """Raised when a DNS query fails or gets an unusable response"""
+
+
+async def is_delegated(name: str, tld: str) -> bool:
+    """
+    Checks if the TLD's nameservers delegate a domain.
+
+    Args:
+        name (str): the domain name to check
+        tld (str): the tld of the domain
+
+    Returns:
+        True if the domain has NS/SOA records, so it's registered. False if
+        it doesn't or the check failed; the domain may still be registered.
+    """
+    domain = f"{name}.{tld}".lower()
+    try:
+        nameservers = await _nameservers_of(tld)
+    except DNSError:
+        return False
+
+    for nameserver in nameservers:
+        try:
+            rcode, records = await query(domain, TYPE_NS, nameserver, recursive=False)
+        except DNSError:
+            continue
+
+        if rcode != RCODE_NOERROR:
+            return False
+        return any(
+            rtype in (TYPE_NS, TYPE_SOA) and owner == domain
+            for owner, rtype, _ in records
+        )
+
+    return False
+
+
+async def query(
+    qname: str, qtype: int, server: Tuple[str, int], recursive: bool = True
+) -> Tuple[int, List[tuple]]:
+    """
+    Sends a single DNS query over UDP.
+
+    Args:
+        qname (str): the name to query
+        qtype (int): the record type to query
+        server ((str, int)): the host and port of the nameserver
+        recursive (bool): if recursion is desired
+
+    Returns:
+        (rcode, records) where records are (owner, type, rdata) tuples from
+        the answer, authority and additional sections.
+
+    Raises:
+        DNSError: if the server doesn't answer in time or the answer is malformed
+    """
+    query_id = random.randint(0, 0xFFFF)
+    try:
+        packet = _build_query(query_id, qname, qtype, recursive)
+    except UnicodeError as exc:
+        raise DNSError(f"can't encode {qname}") from exc
+
+    loop = asyncio.get_running_loop()
+    answered = loop.create_future()
+
+    class _Protocol(asyncio.DatagramProtocol):
+        def datagram_received(self, data, addr):
+            if len(data) >= 2 and struct.unpack("!H", data[:2])[0] == query_id:
+                if not answered.done():
+                    answered.set_result(data)
+
+        def error_received(self, exc):
+            if not answered.done():
+                answered.set_exception(exc)
+
+    try:
+        transport, _ = await loop.create_datagram_endpoint(
+            _Protocol, remote_addr=server
+        )
+    except OSError as exc:
+        raise DNSError(str(exc)) from exc
+
+    try:
+        transport.sendto(packet)
+        response = await asyncio.wait_for(answered, get_setting("DNS_TIMEOUT"))
+    except (OSError, asyncio.TimeoutError) as exc:
+        raise DNSError(f"no answer from {server[0]}") from exc
+    finally:
+        transport.close()
+
+    try:
+        return _parse_response(response)
+    except (struct.error, IndexError, UnicodeDecodeError) as exc:
+        raise DNSError(f"malformed answer from {server[0]}") from exc
+
+
+async def _nameservers_of(tld: str) -> List[Tuple[str, int]]:
+    configured = get_setting("DNS_TLD_NAMESERVERS").get(tld)
+    if configured:
+        return [_address(nameserver) for nameserver in configured]
+
+    if tld not in _tld_nameservers:
+        resolver = _address(get_setting("DNS_RESOLVER"))
+
+        _, records = await query(tld, TYPE_NS, resolver)
+        hosts = [rdata for _, rtype, rdata in records if rtype == TYPE_NS]
+
+        addresses = []
+        for host in hosts[:3]:
+            try:
+                _, records = await query(host, TYPE_A, resolver)
+            except DNSError:
+                continue
+            addresses.extend(
+                (rdata, DNS_PORT) for _, rtype, rdata in records if rtype == TYPE_A
+            )
+
+        if not addresses:
+            raise DNSError(f"no nameservers found for {tld}")
+        _tld_nameservers[tld] = addresses
+
+    return _tld_nameservers[tld]
+
+
+def _address(nameserver: str) -> Tuple[str, int]:
+    host, _, port = nameserver.partition(":")
+    return (host, int(port) if port else DNS_PORT)
+
+
+def _build_query(query_id: int, qname: str, qtype: int, recursive: bool) -> bytes:
+    flags = 0x0100 if recursive else 0
+    header = struct.pack("!HHHHHH", query_id, flags, 1, 0, 0, 0)
+    return header + _encode_name(qname) + struct.pack("!HH", qtype, CLASS_IN)
+
+
+def _encode_name(name: str) -> bytes:
+    encoded = b""
+    for label in name.strip(".").split("."):
+        label = label.encode("idna")
+        encoded += bytes([len(label)]) + label
+    return encoded + b"\0"
+
+
+def _parse_response(data: bytes) -> Tuple[int, List[tuple]]:
+    _, flags, qdcount, ancount, nscount, arcount = struct.unpack("!HHHHHH", data[:12])
+    offset = 12
+
+    for _ in range(qdcount):
+        _, offset = _decode_name(data, offset)
+        offset += 4
+
+    records = []
+    for _ in range(ancount + nscount + arcount):
+        owner, offset = _decode_name(data, offset)
+        rtype, _, _, rdlength = struct.unpack("!HHIH", data[offset : offset + 10])
+        offset += 10
+
+        if rtype in (TYPE_NS, TYPE_SOA):
+            rdata, _ = _decode_name(data, offset)
+        elif rtype == TYPE_A:
+            rdata = ".".join(str(octet) for octet in data[offset : offset + 4])
+        else:
+            rdata = data[offset : offset + rdlength]
+
+        records.append((owner, rtype, rdata))
+        offset += rdlength
+
+    return flags & 0xF, records
+
+
+def _decode_name(data: bytes, offset: int) -> Tuple[str, int]:
+    labels = []
+    end = None
+    jumps = 0
+
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            # compression pointer, the name continues elsewhere
+            jumps += 1
+            if jumps > 16:
+                raise IndexError("compression loop")
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack("!H", data[offset : offset + 2])[0] & 0x3FFF
+            continue
+
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset : offset + length].decode("ascii").lower())
+        offset += length
+
+    return ".".join(labels), end if end is not None else offset
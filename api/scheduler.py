@@ -0,0 +1,186 @@
+"""Schedules WHOIS queries so that no registry gets more than it tolerates"""
+import asyncio
+import time
+import weakref
+from collections import Counter
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from . import metrics
+from .conf import get_setting
+from .sharedstate import SharedRateLimits, get_rate_limits
+
+IANA_WHOIS_SERVER = "whois.iana.org"
+
+# asyncio primitives are bound to the event loop they were first used on
+_schedulers = weakref.WeakKeyDictionary()
+
+
+@lru_cache(maxsize=None)
+def whois_server(tld: str) -> str:
+    """
+    Returns the authoritative WHOIS server for a TLD.
+
+    Args:
+        tld (str): the tld, e.g. 'com' or 'co.uk'
+
+    Note:
+        TLDs without a known server are looked up through IANA.
+    """
+    # pylint: disable=import-outside-toplevel
+    from asyncwhois.servers import CountryCodeTLD, GenericTLD, SponsoredTLD
+
+    attribute = tld.rsplit(".", maxsplit=1)[-1].upper().replace("-", "_")
+    for servers in (CountryCodeTLD, GenericTLD, SponsoredTLD):
+        server = getattr(servers, attribute, None)
+        if server:
+            return server
+    return IANA_WHOIS_SERVER
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter.
+
+    Attributes:
+        rate (float): tokens added per second
+        capacity (float): maximum number of tokens, i.e. the allowed burst
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose tokens are shared by the processes of the host.
+
+    Attributes:
+        key (str): the bucket, e.g. the WHOIS server
+        rate (float): tokens added per second
+        capacity (float): maximum number of tokens, i.e. the allowed burst
+    """
+
+    def __init__(
+        self, limits: SharedRateLimits, key: str, rate: float, capacity: float
+    ):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self._limits = limits
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        while True:
+            wait = self._limits.take(self.key, self.rate, self.capacity)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class Scheduler:
+    """
+    Bounds the queries in flight, globally and per WHOIS server.
+
+    Attributes:
+        max_in_flight (int): the maximum number of queries in flight overall
+    """
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._servers = {}
+        # queries waiting for or holding a slot, by server
+        self._backlog = Counter()
+
+    @asynccontextmanager
+    async def slot(self, tld: str):
+        """
+        Waits for the right to query the WHOIS server of `tld` and holds it.
+
+        Args:
+            tld (str): the tld of the domain about to be queried
+        """
+        server = whois_server(tld)
+        semaphore, bucket = self._server_limits(server)
+        self._backlog[server] += 1
+        try:
+            async with semaphore:
+                await bucket.acquire()
+                async with self._in_flight:
+                    with metrics.LOOKUPS_IN_FLIGHT.track(server=server):
+                        yield
+        finally:
+            self._backlog[server] -= 1
+
+    def backlog(self, server: str) -> int:
+        """Returns the number of queries to `server` queued or in flight."""
+        return self._backlog[server]
+
+    def _server_limits(self, server: str) -> tuple:
+        if server not in self._servers:
+            limits = server_limits(server)
+            shared = get_rate_limits()
+            if shared is None:
+                bucket = TokenBucket(limits["RATE"], limits["BURST"])
+            else:
+                # the rate is for the host, not for every worker
+                bucket = SharedTokenBucket(
+                    shared, server, limits["RATE"], limits["BURST"]
+                )
+            self._servers[server] = (asyncio.Semaphore(limits["CONCURRENCY"]), bucket)
+        return self._servers[server]
+
+
+def server_limits(server: str) -> dict:
+    """
+    Returns the CONCURRENCY, RATE and BURST allowed to a WHOIS server.
+    """
+    return {
+        "CONCURRENCY": get_setting("WHOIS_SERVER_CONCURRENCY"),
+        "RATE": get_setting("WHOIS_SERVER_RATE"),
+        "BURST": get_setting("WHOIS_SERVER_BURST"),
+        **get_setting("WHOIS_SERVER_LIMITS").get(server, {}),
+    }
+
+
+def backlog(server: str) -> int:
+    """
+    Returns the number of queries to `server` queued or in flight on the
+    running event loop, 0 outside of one.
+    """
+    try:
+        scheduler = _schedulers.get(asyncio.get_running_loop())
+    except RuntimeError:
+        return 0
+    return 0 if scheduler is None else scheduler.backlog(server)
+
+
+def get_scheduler() -> Scheduler:
+    """
+    Returns the scheduler of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = Scheduler(get_setting("WHOIS_MAX_IN_FLIGHT"))
+        _schedulers[loop] = scheduler
+    return scheduler
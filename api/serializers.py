@@ -1,5 +1,8 @@
+from djoser import serializers as djoser_serializers
 from rest_framework import serializers
-from .models import Domain
+
+from . import history
+from .models import Domain, User
 
 
 class DomainSerializer(serializers.ModelSerializer):
@@ -8,3 +11,55 @@ class DomainSerializer(serializers.ModelSerializer):
     class Meta:
         model = Domain
         fields = ["name", "tld", "registered"]
+
+
+class HistoryMixin(serializers.Serializer):
+    """
+    Adds a page of the user's search history, selected by the `history_before`
+    query parameter, and the cursor of the next page as `history_next`.
+    """
+
+    history = serializers.SerializerMethodField()
+    history_next = serializers.SerializerMethodField()
+
+    def get_history(self, user):
+        return self._history_page(user)[0]
+
+    def get_history_next(self, user):
+        return self._history_page(user)[1]
+
+    def _history_page(self, user):
+        # both fields come from the same query
+        if not hasattr(self, "_page"):
+            request = self.context.get("request")
+            before = request.query_params.get("history_before") if request else None
+            try:
+                before = int(before) if before is not None else None
+            except ValueError as exc:
+                raise serializers.ValidationError(
+                    {"history_before": ["Expected the cursor of a page"]}
+                ) from exc
+            self._page = history.page(user, before)
+        return self._page
+
+
+class UserSerializer(HistoryMixin, djoser_serializers.UserSerializer):
+    """Serializer class for the current User, with their search history"""
+
+    class Meta(djoser_serializers.UserSerializer.Meta):
+        model = User
+        fields = djoser_serializers.UserSerializer.Meta.fields + (
+            "history",
+            "history_next",
+        )
+
+
+class UserCreateSerializer(HistoryMixin, djoser_serializers.UserCreateSerializer):
+    """Serializer class for new Users"""
+
+    class Meta(djoser_serializers.UserCreateSerializer.Meta):
+        model = User
+        fields = djoser_serializers.UserCreateSerializer.Meta.fields + (
+            "history",
+            "history_next",
+        )
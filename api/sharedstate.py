@@ -0,0 +1,215 @@
+"""State shared by the processes of a host, in memory-mapped files"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .conf import get_setting
+
+# slots tried after the one a key hashes to
+PROBES = 8
+
+
+class MappedTable:
+    """
+    Fixed size open addressing hash table in a memory-mapped file.
+
+    Keys are stored as their 16 byte digest, at the start of every record.
+    Every process of the host that opens the same file sees the same table.
+
+    The number of slots is part of the file name: a table opened with another
+    size is another file, so that a file mapped by live processes is never
+    resized under them (which would crash them with SIGBUS).
+
+    Attributes:
+        path (Path): the file of the table, `<path>.<slots>`, created if missing
+        slots (int): the number of records, a power of two
+    """
+
+    MAGIC = b"DFST"
+    HEADER = struct.Struct("<4sI")
+    RECORD: struct.Struct = None
+
+    def __init__(self, path, slots: int):
+        # rounded up to a power of two, so that hashes are masked
+        self.slots = 1 << max(slots - 1, 1).bit_length()
+        self.path = Path(f"{path}.{self.slots}")
+        size = self.HEADER.size + self.slots * self.RECORD.size
+        header = self.HEADER.pack(self.MAGIC, self.slots)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            self._create(size, header)
+        self._fd = os.open(self.path, os.O_RDWR)
+        if os.pread(self._fd, self.HEADER.size, 0) != header:
+            os.close(self._fd)
+            raise ValueError(f"{self.path} isn't a table of {self.slots} slots")
+        self._map = mmap.mmap(self._fd, size)
+        # record locks are held by processes, not threads
+        self._lock = threading.Lock()
+
+    def _create(self, size: int, header: bytes):
+        # made aside then linked in place, so that no process maps it half
+        # made and an existing file is never truncated
+        fd, temporary = tempfile.mkstemp(
+            prefix=f".{self.path.name}.", dir=self.path.parent
+        )
+        try:
+            os.ftruncate(fd, size)
+            os.pwrite(fd, header, 0)
+            try:
+                os.link(temporary, self.path)
+            except FileExistsError:
+                # another process created it first
+                pass
+        finally:
+            os.close(fd)
+            os.unlink(temporary)
+
+    def _offsets(self, digest: bytes):
+        first = int.from_bytes(digest[:8], "little") & (self.slots - 1)
+        for probe in range(PROBES):
+            yield self.HEADER.size + ((first + probe) & (self.slots - 1)) * (
+                self.RECORD.size
+            )
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+
+class HostCache(MappedTable):
+    """
+    Cache of boolean values with a TTL, shared by the processes of a host.
+
+    Reads and writes take no lock: every record carries a checksum, and a
+    record torn by concurrent writers is read as a miss. When the slots a key
+    can go in are taken, the one expiring first is replaced.
+    """
+
+    # digest, expires at, value, checksum of the rest
+    RECORD = struct.Struct("<16sd?3xI")
+    _UNCHECKED = struct.Struct("<16sd?3x")
+
+    def get(self, key: str) -> Optional[Tuple[bool, float]]:
+        """
+        Returns a `(value, expires_at)` tuple stored under `key`, or None.
+        """
+        digest = _digest(key)
+        for offset in self._offsets(digest):
+            record = self._read(offset)
+            if record is not None and record[0] == digest:
+                _, expires_at, value = record
+                return (value, expires_at) if expires_at > time.time() else None
+        return None
+
+    def set(self, key: str, value: bool, ttl: float):
+        """Stores `value` under `key` for `ttl` seconds."""
+        digest = _digest(key)
+        now = time.time()
+        target, soonest = None, None
+        for offset in self._offsets(digest):
+            record = self._read(offset)
+            if record is None or record[0] == digest or record[1] <= now:
+                target = offset
+                break
+            if soonest is None or record[1] < soonest:
+                target, soonest = offset, record[1]
+
+        unchecked = self._UNCHECKED.pack(digest, now + ttl, value)
+        self._map[target : target + self.RECORD.size] = unchecked + struct.pack(
+            "<I", zlib.crc32(unchecked)
+        )
+
+    def _read(self, offset: int):
+        record = self._map[offset : offset + self.RECORD.size]
+        unchecked, (checksum,) = record[:-4], struct.unpack("<I", record[-4:])
+        if zlib.crc32(unchecked) != checksum:
+            # empty or torn
+            return None
+        return self._UNCHECKED.unpack(unchecked)
+
+
+class SharedRateLimits(MappedTable):
+    """
+    Token buckets shared by the processes of a host, one per key.
+    """
+
+    # digest, tokens, updated at (time.monotonic is the same for every process)
+    RECORD = struct.Struct("<16sdd")
+
+    def take(self, key: str, rate: float, capacity: float) -> float:
+        """
+        Takes a token from the bucket of `key`, if it has one.
+
+        Args:
+            key (str): e.g. the WHOIS server
+            rate (float): tokens added per second
+            capacity (float): maximum number of tokens, i.e. the allowed burst
+
+        Returns:
+            0 if a token was taken, or the seconds until one is available.
+        """
+        digest = _digest(key)
+        empty = bytes(16)
+        with self._locked():
+            now = time.monotonic()
+            for offset in self._offsets(digest):
+                found, tokens, updated_at = self.RECORD.unpack_from(self._map, offset)
+                if found == digest:
+                    tokens = min(capacity, tokens + (now - updated_at) * rate)
+                    break
+                if found == empty:
+                    tokens = capacity
+                    break
+            else:
+                # every slot is taken by other keys, don't throttle
+                return 0
+
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self.RECORD.pack_into(self._map, offset, digest, tokens, now)
+        return wait
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+@lru_cache(maxsize=None)
+def get_host_cache() -> Optional[HostCache]:
+    """
+    Returns the result cache shared by the processes of the host, or None if
+    SHARED_STATE_DIR isn't set.
+    """
+    directory = get_setting("SHARED_STATE_DIR")
+    if not directory:
+        return None
+    return HostCache(Path(directory) / "results", get_setting("SHARED_CACHE_SLOTS"))
+
+
+@lru_cache(maxsize=None)
+def get_rate_limits() -> Optional[SharedRateLimits]:
+    """
+    Returns the token buckets shared by the processes of the host, or None if
+    SHARED_STATE_DIR isn't set.
+    """
+    directory = get_setting("SHARED_STATE_DIR")
+    if not directory:
+        return None
+    return SharedRateLimits(Path(directory) / "rate_limits", 4096)
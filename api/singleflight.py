@@ -0,0 +1,72 @@
+"""Coalesces identical concurrent calls into a single one"""
+import asyncio
+import weakref
+from typing import Awaitable, Callable
+
+# futures are bound to the event loop they were created on
+_groups = weakref.WeakKeyDictionary()
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers with the
+    same key await the call already in flight.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._waiters = {}
+
+    async def do(self, key: str, call: Callable[[], Awaitable]):
+        """
+        Returns the result of `call()`, or of the call in flight for `key`.
+
+        Note:
+            A caller being cancelled only cancels the call if no other caller
+            is waiting for it.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._leave(key, task)
+
+    def in_flight(self) -> int:
+        """Returns the number of calls in flight."""
+        return len(self._calls)
+
+    def _leave(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is not task:
+            return
+        self._waiters[key] -= 1
+        if not self._waiters[key] and not task.done():
+            # nobody is left to use the result
+            del self._calls[key]
+            del self._waiters[key]
+            task.cancel()
+
+    def _forget(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+        if not task.cancelled():
+            # marks the error as retrieved, in case every caller was cancelled
+            task.exception()
+
+
+def get_single_flight() -> SingleFlight:
+    """
+    Returns the single flight group of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    group = _groups.get(loop)
+    if group is None:
+        group = SingleFlight()
+        _groups[loop] = group
+    return group
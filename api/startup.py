@@ -0,0 +1,192 @@
+"""Measures how long a fresh process of the app takes to serve its first request"""
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+
+# loaded by the first lookups that need them, never by a booting process
+LAZY_MODULES = ("asyncwhois", "h2", "httpx", "whois")
+PHASES = ("boot", "startup", "first_request")
+
+# written by the profiled process before every phase but the first
+_MARKER = "-- {}"
+_IMPORT_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def profile(path: str = "/metrics", warm_up: bool = True) -> dict:
+    """
+    Starts a fresh interpreter that imports the ASGI entry point the Procfile
+    serves (settings.ASGI_APPLICATION, domain_finder.asgi), starts it with an
+    ASGI lifespan startup event as uvicorn does and serves `path` once through
+    it, with every import timed by `-X importtime`.
+
+    Args:
+        path (str): the path of the first request, it shouldn't need the
+            database nor the network
+        warm_up (bool): whether the startup warms the process up if
+            WARMUP_ON_STARTUP is on, it looks names up in the network
+
+    Returns:
+        A dict of the seconds the whole process took ("process"), the status
+        of the first request ("status"), and per phase ("boot", importing the
+        entry point with the settings, apps and middlewares, "startup", the
+        lifespan startup with the warm up, then "first_request") its "seconds"
+        and the microseconds each module it imported took to import itself
+        ("imports").
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    args = [path] if warm_up else [path, "--no-warm-up"]
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", __name__, *args],
+        env=env,
+        cwd=settings.BASE_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=False,
+    )
+    seconds = time.perf_counter() - started
+    if process.returncode:
+        raise RuntimeError(f"The profiled process failed:\n{process.stderr[-2000:]}")
+
+    timings = json.loads(process.stdout.splitlines()[-1])
+    imports = _imports(process.stderr.splitlines())
+    return {
+        "process": seconds,
+        "status": timings["status"],
+        **{
+            phase: {"seconds": timings[phase], "imports": imports[phase]}
+            for phase in PHASES
+        },
+    }
+
+
+def packages(imports: Dict[str, int]) -> List[Tuple[str, int]]:
+    """
+    Sums the import times of modules per top level package.
+
+    Returns:
+        (package, microseconds) tuples, the slowest first.
+    """
+    totals = {}
+    for module, micros in imports.items():
+        package = module.split(".", maxsplit=1)[0]
+        totals[package] = totals.get(package, 0) + micros
+    return sorted(totals.items(), key=lambda total: total[1], reverse=True)
+
+
+def _imports(lines: List[str]) -> Dict[str, Dict[str, int]]:
+    markers = {_MARKER.format(phase): phase for phase in PHASES}
+    phases = {phase: {} for phase in PHASES}
+    phase = PHASES[0]
+    for line in lines:
+        if line in markers:
+            phase = markers[line]
+            continue
+        match = _IMPORT_RE.match(line)
+        if match:
+            # the time of the module itself, its own imports are listed too
+            phases[phase][match.group(4)] = int(match.group(1))
+    return phases
+
+
+def _start(phase: str) -> float:
+    print(_MARKER.format(phase), file=sys.stderr, flush=True)
+    return time.perf_counter()
+
+
+async def _serve_first_request(path: str, warm_up: bool) -> dict:
+    # pylint: disable=import-outside-toplevel
+    timings = {}
+    started = time.perf_counter()
+    from django.utils.module_loading import import_string
+
+    application = import_string(settings.ASGI_APPLICATION)
+    if not warm_up:
+        settings.DOMAIN_FINDER = {**settings.DOMAIN_FINDER, "WARMUP_ON_STARTUP": False}
+    timings["boot"] = time.perf_counter() - started
+
+    # the lifespan of the process, it ends once the request is served
+    started = _start("startup")
+    events = asyncio.Queue()
+    for event in ("lifespan.startup", "lifespan.shutdown"):
+        events.put_nowait({"type": event})
+    started_up = asyncio.Event()
+
+    async def send_lifespan(message):
+        if message["type"] == "lifespan.startup.complete":
+            started_up.set()
+
+    async def receive_lifespan():
+        message = await events.get()
+        if message["type"] == "lifespan.shutdown":
+            await served.wait()
+        return message
+
+    served = asyncio.Event()
+    lifespan = asyncio.ensure_future(
+        application(
+            {"type": "lifespan", "asgi": {"version": "3.0"}},
+            receive_lifespan,
+            send_lifespan,
+        )
+    )
+    await started_up.wait()
+    timings["startup"] = time.perf_counter() - started
+
+    started = _start("first_request")
+    statuses = []
+    request = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if request:
+            return request.pop()
+        await served.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+        elif not message.get("more_body"):
+            served.set()
+
+    await application(_http_scope(path), receive, send)
+    timings["first_request"] = time.perf_counter() - started
+
+    served.set()
+    await lifespan
+    return {**timings, "status": statuses[0]}
+
+
+def _http_scope(path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+
+
+if __name__ == "__main__":
+    print(
+        json.dumps(
+            asyncio.run(
+                _serve_first_request(sys.argv[1], "--no-warm-up" not in sys.argv[2:])
+            )
+        )
+    )
@@ -0,0 +1,140 @@
+"""Persistent store of lookup results"""
+import datetime
+import logging
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError
+from django.db.models import Q
+from django.utils import timezone
+
+from .backends import Registration
+from .cache import result_ttl
+from .conf import get_setting
+from .models import LookupResult
+from .writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+
+class LookupStore:
+    """
+    Keeps the answer of every lookup in the LookupResult table.
+
+    Answers are read back while they're fresh (see `result_ttl`), writes are
+    buffered and upserted in bulk by a BatchWriter.
+    """
+
+    def __init__(self, batch_size: int, interval: float):
+        self.writer = BatchWriter(self._upsert, batch_size, interval)
+
+    async def get(self, name: str, tld: str) -> Optional[Tuple[bool, float]]:
+        """
+        Reads the stored answer of a domain.
+
+        Returns:
+            (registered, ttl): the answer and the seconds it stays fresh, or
+            None if there's no fresh answer.
+        """
+        try:
+            return await sync_to_async(self._get)(name.lower(), tld.lower())
+        except DatabaseError:
+            # the store only saves lookups, it mustn't make them fail
+            logger.exception("Couldn't read the stored answer of %s.%s", name, tld)
+            return None
+
+    def save(self, name: str, tld: str, registration: Registration):
+        """Queues the answer of a lookup to be stored."""
+        self.writer.add(
+            LookupResult(
+                name=name.lower(),
+                tld=tld.lower(),
+                registered=registration.registered,
+                checked_at=timezone.now(),
+                source=registration.source,
+                expires_on=registration.expires,
+            )
+        )
+
+    def flush(self):
+        """
+        Stores every queued answer now.
+
+        Raises:
+            DatabaseError: if some answers couldn't be stored since the last
+                flush.
+        """
+        self.writer.flush()
+
+    def _get(self, name: str, tld: str) -> Optional[Tuple[bool, float]]:
+        result = LookupResult.objects.filter(name=name, tld=tld).first()
+        if result is None:
+            return None
+
+        ttl = remaining_ttl(result, timezone.now())
+        if ttl <= 0:
+            return None
+        return result.registered, ttl
+
+    @staticmethod
+    def _upsert(results: List[LookupResult]):
+        # the last answer of a domain wins, and postgres rejects a batch that
+        # updates the same row twice
+        latest = {(result.name, result.tld): result for result in results}
+        LookupResult.objects.bulk_create(
+            list(latest.values()),
+            update_conflicts=True,
+            unique_fields=["name", "tld"],
+            update_fields=["registered", "checked_at", "source", "expires_on"],
+        )
+
+
+def remaining_ttl(result: LookupResult, now: datetime.datetime) -> float:
+    """
+    Returns the seconds a stored answer stays fresh, 0 or less once it's stale.
+
+    Answers are stale after their TTL, and registered ones are also stale once
+    the registration expired.
+    """
+    if result.expires_on and result.expires_on < now.date():
+        return 0
+    age = (now - result.checked_at).total_seconds()
+    return result_ttl(result.registered) - age
+
+
+def stale_results(expiring_within: int) -> Iterable[LookupResult]:
+    """
+    Returns the stored answers due to be looked up again.
+
+    Args:
+        expiring_within (int): days before the expiry of a registration
+            at which it's checked again, at most every CACHE_AVAILABLE_TTL
+
+    Returns:
+        A queryset of LookupResult, oldest first.
+    """
+    now = timezone.now()
+    seconds = datetime.timedelta(seconds=1)
+    registered_before = now - get_setting("CACHE_REGISTERED_TTL") * seconds
+    available_before = now - get_setting("CACHE_AVAILABLE_TTL") * seconds
+
+    expired = Q(registered=True, checked_at__lte=registered_before) | Q(
+        registered=False, checked_at__lte=available_before
+    )
+    expiring = Q(
+        registered=True,
+        expires_on__lte=now.date() + datetime.timedelta(days=expiring_within),
+        checked_at__lte=available_before,
+    )
+    return LookupResult.objects.filter(expired | expiring).order_by("checked_at")
+
+
+@lru_cache(maxsize=None)
+def get_lookup_store() -> LookupStore:
+    """
+    Returns the process wide lookup store.
+    """
+    return LookupStore(
+        get_setting("STORE_BATCH_SIZE"), get_setting("STORE_FLUSH_INTERVAL")
+    )
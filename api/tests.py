@@ -1,7 +1,62 @@
+import asyncio
+import datetime
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import httpx
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from faker import Faker
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import (
+    backends,
+    benchmark,
+    datamuse,
+    engine,
+    history,
+    jobs,
+    metrics,
+    policy,
+    renderers,
+    resolver,
+    startup,
+    tldplan,
+    warmup,
+    whoisclient,
+    zones,
+)
+from .backends import RDAPBackend, Registration, WhoisBackend, rdap_base_url
+from .cache import (
+    LRUCache,
+    ResultCache,
+    get_response_cache,
+    get_result_cache,
+    result_ttl,
+)
+from .candidates import WordIndex, get_word_index, similar_names
+from .conf import get_setting
+from .scheduler import Scheduler, TokenBucket, get_scheduler, whois_server
+from .models import LookupResult, SearchHistory, SearchJob
+from .renderers import FastJSONRenderer
+from .serializers import DomainSerializer
+from .sharedstate import HostCache, SharedRateLimits
+from .singleflight import SingleFlight
+from .store import LookupStore, stale_results
+from .validators import TLD_ERROR, is_valid_name, validate_domains
+from .writer import BatchWriter
 
 
 class RegistrationStatusTestCase(APITestCase):
@@ -39,6 +94,68 @@ class SimilarDomainsTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+class BatchRegistrationStatusTestCase(APITestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create(username="batcher")
+        )
+        self.endpoint_url = "/api/v1/registrationStatus/batch"
+
+    def _post(self, domains):
+        return self.client.post(self.endpoint_url, {"domains": domains}, format="json")
+
+    def test_if_statuses_are_streamed(self):
+        response = self._post(
+            ["google.com", "https://google.com", "hqweyvzdiohqwuetybasas.com"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        lines = [json.loads(line) for line in b"".join(response).splitlines()]
+        registered = {line["name"]: line["registered"] for line in lines}
+        self.assertEqual(registered, {"google": True, "hqweyvzdiohqwuetybasas": False})
+
+    def test_if_illformed_domain_is_reported(self):
+        response = self._post(["this_is not okay.com"])
+        lines = [json.loads(line) for line in b"".join(response).splitlines()]
+        self.assertTrue("errors" in lines[0])
+
+    @override_settings(DOMAIN_FINDER={"BATCH_MAX_DOMAINS": 1})
+    def test_if_too_many_domains_are_rejected(self):
+        response = self._post(["google.com", "google.org"])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_if_domains_are_checked_once_whatever_their_case(self):
+        lookup_many = mock.MagicMock(return_value=_aiter([]))
+        with mock.patch.object(engine, "lookup_many", lookup_many):
+            b"".join(self._post(["Google.com", "google.COM", "google.org"]))
+
+        self.assertEqual(
+            list(lookup_many.call_args.args[0]), [("google", "com"), ("google", "org")]
+        )
+
+    def test_if_anonymous_users_are_rejected(self):
+        self.client.force_authenticate(None)
+        response = self._post(["google.com"])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(DOMAIN_FINDER={"BATCH_RATE": "1/hour"})
+    def test_if_batches_are_throttled(self):
+        caches["default"].clear()
+        with mock.patch.object(engine, "lookup_many", lambda *args: _aiter([])):
+            statuses = [self._post([]).status_code for _ in range(2)]
+
+        self.assertEqual(
+            statuses, [status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS]
+        )
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
 class UserAuthTestCase(APITestCase):
     def setUp(self) -> None:
         super().setUp()
@@ -113,3 +230,1411 @@ class UserAuthTestCase(APITestCase):
         )
 
         self.assertTrue("google.com" in me_response.data["history"])
+
+    @override_settings(DOMAIN_FINDER={"HISTORY_PAGE_SIZE": 2})
+    def test_if_history_is_paginated(self):
+        User = get_user_model()
+        user = User.objects.create(email=self.faker.email(), username="someuser")
+        for domain in ["google.com", "google.org", "google.net"]:
+            history.record(user, domain)
+        self.client.force_authenticate(user)
+
+        first_page = self.client.get(self.me_endpoint_url, follow=True)
+        second_page = self.client.get(
+            self.me_endpoint_url,
+            {"history_before": first_page.data["history_next"]},
+            follow=True,
+        )
+
+        self.assertEqual(first_page.data["history"], ["google.net", "google.org"])
+        self.assertEqual(second_page.data["history"], ["google.com"])
+        self.assertIsNone(second_page.data["history_next"])
+
+
+class ResultCacheTestCase(SimpleTestCase):
+    def test_if_lru_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("google.com", True, 60)
+        cache.set("google.org", True, 60)
+        cache.get("google.com")
+        cache.set("google.net", False, 60)
+
+        self.assertTrue(cache.get("google.com"))
+        self.assertIsNone(cache.get("google.org"))
+        self.assertFalse(cache.get("google.net"))
+
+    def test_if_expired_entries_are_misses(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("google.com", True, 0)
+
+        self.assertIsNone(cache.get("google.com"))
+
+    def test_if_available_answers_are_cached(self):
+        cache = ResultCache(LRUCache(maxsize=2))
+        cache.set("hqweyvzdiohqwuetybasas.com", False, 60)
+
+        self.assertIs(cache.get("hqweyvzdiohqwuetybasas.com"), False)
+
+
+class DatamuseTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.requested = []
+        datamuse._suggestions.clear()
+
+    def _client(self):
+        def handler(request):
+            self.requested.append(str(request.url))
+            return httpx.Response(200, json=[{"word": "gogle"}, {"word": "googol"}])
+
+        return httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url="https://datamuse.test"
+        )
+
+    def test_if_every_endpoint_is_queried(self):
+        with mock.patch.object(datamuse, "_get_client", self._client):
+            words = asyncio.run(datamuse.suggestions("google"))
+
+        self.assertEqual(len(self.requested), len(datamuse.ENDPOINTS))
+        self.assertEqual(words.count("googol"), len(datamuse.ENDPOINTS))
+
+    def test_if_suggestions_are_cached(self):
+        with mock.patch.object(datamuse, "_get_client", self._client):
+            asyncio.run(datamuse.suggestions("google"))
+            asyncio.run(datamuse.suggestions("google"))
+
+        self.assertEqual(len(self.requested), len(datamuse.ENDPOINTS))
+
+
+class SchedulerTestCase(SimpleTestCase):
+    def test_if_tlds_map_to_their_whois_server(self):
+        self.assertEqual(whois_server("com"), "whois.verisign-grs.com")
+        self.assertEqual(whois_server("co.uk"), whois_server("uk"))
+
+    def test_if_token_bucket_limits_rate(self):
+        async def acquire_many():
+            bucket = TokenBucket(rate=100, capacity=1)
+            for _ in range(5):
+                await bucket.acquire()
+
+        start = time.monotonic()
+        asyncio.run(acquire_many())
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.035)
+
+    @override_settings(DOMAIN_FINDER={"WHOIS_SERVER_CONCURRENCY": 2})
+    def test_if_concurrency_per_server_is_bounded(self):
+        in_flight = [0]
+        peak = [0]
+
+        async def query(scheduler):
+            async with scheduler.slot("com"):
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+                await asyncio.sleep(0.01)
+                in_flight[0] -= 1
+
+        async def query_many():
+            scheduler = Scheduler(max_in_flight=10)
+            await asyncio.gather(*[query(scheduler) for _ in range(6)])
+
+        asyncio.run(query_many())
+        self.assertEqual(peak[0], 2)
+
+
+class _StubNameserver(asyncio.DatagramProtocol):
+    """Answers NS queries with a referral for delegated names, NXDOMAIN otherwise"""
+
+    def __init__(self, delegated):
+        self.delegated = delegated
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        query_id = struct.unpack("!H", data[:2])[0]
+        qname, end = resolver._decode_name(data, 12)
+        question = data[12 : end + 4]
+
+        if qname in self.delegated:
+            ns_name = resolver._encode_name("ns1." + qname)
+            referral = struct.pack(
+                "!HHHIH", 0xC00C, resolver.TYPE_NS, 1, 3600, len(ns_name)
+            )
+            header = struct.pack("!HHHHHH", query_id, 0x8000, 1, 0, 1, 0)
+            self.transport.sendto(header + question + referral + ns_name, addr)
+        else:
+            header = struct.pack("!HHHHHH", query_id, 0x8003, 1, 0, 0, 0)
+            self.transport.sendto(header + question, addr)
+
+
+class DNSPrecheckTestCase(SimpleTestCase):
+    def _is_delegated(self, name, tld):
+        async def check():
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _StubNameserver({"google.com"}), local_addr=("127.0.0.1", 0)
+            )
+            port = transport.get_extra_info("sockname")[1]
+            try:
+                with self.settings(
+                    DOMAIN_FINDER={"DNS_TLD_NAMESERVERS": {tld: [f"127.0.0.1:{port}"]}}
+                ):
+                    return await resolver.is_delegated(name, tld)
+            finally:
+                transport.close()
+
+        return asyncio.run(check())
+
+    def test_if_delegated_domain_is_detected(self):
+        self.assertTrue(self._is_delegated("google", "com"))
+
+    def test_if_undelegated_domain_is_not(self):
+        self.assertFalse(self._is_delegated("hqweyvzdiohqwuetybasas", "com"))
+
+    @override_settings(
+        DOMAIN_FINDER={
+            "DNS_TLD_NAMESERVERS": {"com": ["127.0.0.1:9"]},
+            "DNS_TIMEOUT": 0.1,
+        }
+    )
+    def test_if_unreachable_nameserver_is_inconclusive(self):
+        self.assertFalse(asyncio.run(resolver.is_delegated("google", "com")))
+
+
+class RDAPBackendTestCase(SimpleTestCase):
+    def _is_registered(self, name, tld, status_code=200):
+        def handler(request):
+            return httpx.Response(status_code, json={"objectClassName": "domain"})
+
+        backend = RDAPBackend()
+        client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url=rdap_base_url("com")
+        )
+        with mock.patch.object(backend, "_client", return_value=client):
+            return asyncio.run(backend.is_registered(name, tld))
+
+    def test_if_bundled_bootstrap_is_used(self):
+        self.assertEqual(rdap_base_url("com"), "https://rdap.verisign.com/com/v1/")
+
+    def test_if_registered_domain_is_registered(self):
+        self.assertTrue(self._is_registered("google", "com"))
+
+    def test_if_missing_domain_is_unregistered(self):
+        self.assertFalse(self._is_registered("hqweyvzdiohqwuetybasas", "com", 404))
+
+    def test_if_tld_without_rdap_falls_back_to_whois(self):
+        backend = RDAPBackend()
+        with mock.patch.object(
+            backend.fallback, "is_registered", mock.AsyncMock(return_value=True)
+        ) as whois:
+            self.assertTrue(asyncio.run(backend.is_registered("google", "ru")))
+        whois.assert_awaited_once_with("google", "ru")
+
+    def test_if_expiration_is_read(self):
+        def handler(request):
+            return httpx.Response(
+                200,
+                json={
+                    "objectClassName": "domain",
+                    "events": [
+                        {"eventAction": "registration", "eventDate": "1997-09-15"},
+                        {
+                            "eventAction": "expiration",
+                            "eventDate": "2028-09-14T04:00:00Z",
+                        },
+                    ],
+                },
+            )
+
+        backend = RDAPBackend()
+        client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url=rdap_base_url("com")
+        )
+        with mock.patch.object(backend, "_client", return_value=client):
+            registration = asyncio.run(backend.lookup("google", "com"))
+
+        self.assertEqual(
+            registration, Registration(True, datetime.date(2028, 9, 14), "rdap")
+        )
+
+
+class SimilarDomainsDeadlineTestCase(SimpleTestCase):
+    def test_if_slow_lookups_are_reported_after_deadline(self):
+        async def whois_query(name, tld):
+            await asyncio.sleep(5 if tld == "net" else 0)
+            return False
+
+        async def similar_names(name, limit=None):
+            return ["gogle"]
+
+        with mock.patch.object(engine, "whois_query", whois_query), mock.patch.object(
+            engine, "_similar_names", similar_names
+        ), mock.patch.object(engine, "POPULAR_TLDS", ["com", "org", "net"]):
+            domains, failures = asyncio.run(
+                engine.similar_domains("google", "com", deadline=0.1)
+            )
+
+        self.assertEqual([domain.tld for domain in domains], ["org", "org"])
+        self.assertEqual(
+            sorted(failures),
+            [
+                engine.LookupFailure("gogle", "net", engine.LookupFailure.TIMEOUT),
+                engine.LookupFailure("google", "net", engine.LookupFailure.TIMEOUT),
+            ],
+        )
+
+
+@override_settings(DOMAIN_FINDER={"LOOKUP_BACKOFF": 0})
+class LookupPolicyTestCase(SimpleTestCase):
+    def test_if_transient_errors_are_retried(self):
+        attempts = []
+
+        async def attempt():
+            attempts.append(None)
+            if len(attempts) < 3:
+                raise ConnectionResetError()
+            return True
+
+        self.assertTrue(asyncio.run(policy.run(attempt, "retry.test")))
+        self.assertEqual(len(attempts), 3)
+
+    @override_settings(DOMAIN_FINDER={"LOOKUP_TIMEOUT": 0.05, "LOOKUP_RETRIES": 0})
+    def test_if_hung_lookups_time_out(self):
+        async def attempt():
+            await asyncio.sleep(5)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(policy.run(attempt, "timeout.test"))
+
+    @override_settings(DOMAIN_FINDER={"LOOKUP_HEDGE": True})
+    def test_if_slow_lookups_are_hedged(self):
+        for _ in range(20):
+            policy.latencies.record("hedge.test", 0.01)
+        delays = [5, 0]
+
+        async def attempt():
+            await asyncio.sleep(delays.pop(0))
+            return True
+
+        start = time.monotonic()
+        self.assertTrue(asyncio.run(policy.run(attempt, "hedge.test")))
+        self.assertLess(time.monotonic() - start, 1)
+
+    @override_settings(DOMAIN_FINDER={"LOOKUP_BACKOFF": 0})
+    def test_if_every_attempt_takes_a_slot(self):
+        slots = []
+        attempts = []
+
+        @asynccontextmanager
+        async def slot():
+            slots.append(None)
+            yield
+
+        async def attempt():
+            attempts.append(len(slots))
+            if len(attempts) < 3:
+                raise ConnectionResetError()
+            return True
+
+        self.assertTrue(asyncio.run(policy.run(attempt, "slot.test", slot)))
+        self.assertEqual(attempts, [1, 2, 3])
+
+    @override_settings(DOMAIN_FINDER={"LOOKUP_HEDGE": True})
+    def test_if_queued_lookups_are_not_hedged(self):
+        for _ in range(20):
+            policy.latencies.record("queued.test", 0.01)
+        attempts = []
+
+        async def run():
+            granted = asyncio.Event()
+            asyncio.get_running_loop().call_later(0.1, granted.set)
+
+            @asynccontextmanager
+            async def slot():
+                await granted.wait()
+                yield
+
+            async def attempt():
+                attempts.append(None)
+                return True
+
+            return await policy.run(attempt, "queued.test", slot)
+
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual(len(attempts), 1)
+
+    @override_settings(
+        DOMAIN_FINDER={
+            "WHOIS_SERVER_CONCURRENCY": 1,
+            "LOOKUP_TIMEOUT": 0.05,
+            "LOOKUP_RETRIES": 0,
+            "LOOKUP_STORE": False,
+        }
+    )
+    def test_if_queued_lookups_dont_time_out(self):
+        get_result_cache().local.clear()
+
+        async def lookup(name, tld, details):
+            await asyncio.sleep(0.02)
+            return Registration(True, None, "whois")
+
+        async def lookup_many():
+            return await asyncio.gather(
+                *[engine.whois_query(f"queued{i}", "com") for i in range(5)]
+            )
+
+        backend = mock.Mock(lookup=lookup)
+        with mock.patch.object(engine, "get_backend", return_value=backend):
+            self.assertEqual(asyncio.run(lookup_many()), [True] * 5)
+        self.assertLess(policy.latencies.quantile(whois_server("com"), 1), 0.05)
+
+
+class SingleFlightTestCase(SimpleTestCase):
+    def test_if_concurrent_calls_are_coalesced(self):
+        calls = []
+
+        async def lookup():
+            calls.append(None)
+            await asyncio.sleep(0.01)
+            return True
+
+        async def lookup_many():
+            group = SingleFlight()
+            return await asyncio.gather(
+                *[group.do("google.com", lookup) for _ in range(5)]
+            )
+
+        self.assertEqual(asyncio.run(lookup_many()), [True] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_if_cancelled_caller_does_not_cancel_others(self):
+        async def lookup():
+            await asyncio.sleep(0.02)
+            return True
+
+        async def lookup_twice():
+            group = SingleFlight()
+            impatient = asyncio.ensure_future(group.do("google.com", lookup))
+            patient = asyncio.ensure_future(group.do("google.com", lookup))
+            await asyncio.sleep(0.005)
+            impatient.cancel()
+            return await patient
+
+        self.assertTrue(asyncio.run(lookup_twice()))
+
+    def test_if_call_is_cancelled_with_its_last_caller(self):
+        cancelled = []
+
+        async def lookup():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(None)
+                raise
+
+        async def lookup_twice():
+            group = SingleFlight()
+            callers = [
+                asyncio.ensure_future(group.do("google.com", lookup)) for _ in range(2)
+            ]
+            await asyncio.sleep(0.005)
+            callers[0].cancel()
+            await asyncio.sleep(0.005)
+            self.assertEqual((group.in_flight(), cancelled), (1, []))
+            callers[1].cancel()
+            await asyncio.sleep(0.005)
+            return group.in_flight()
+
+        self.assertEqual(asyncio.run(lookup_twice()), 0)
+        self.assertEqual(len(cancelled), 1)
+
+
+class ValidatorsTestCase(SimpleTestCase):
+    def test_if_internationalized_names_are_valid(self):
+        self.assertTrue(is_valid_name("münchen"))
+        self.assertTrue(is_valid_name("xn--mnchen-3ya"))
+        self.assertFalse(is_valid_name("this_is not okay"))
+
+    def test_if_domains_are_validated_in_bulk(self):
+        valid, invalid = validate_domains(
+            [("google", "com"), ("g", "com"), ("this_is", "com"), ("google", "zz")]
+        )
+
+        self.assertEqual(valid, [("google", "com")])
+        self.assertEqual(
+            [(name, tld, sorted(errors)) for name, tld, errors in invalid],
+            [
+                ("g", "com", ["name"]),
+                ("this_is", "com", ["name"]),
+                ("google", "zz", ["tld"]),
+            ],
+        )
+
+
+class CandidatesTestCase(SimpleTestCase):
+    def test_if_words_are_found_in_index(self):
+        words = get_word_index()
+
+        self.assertIn("book", words)
+        self.assertNotIn("bookz", words)
+        self.assertNotIn("a" * 100, words)
+
+    def test_if_index_is_built_sorted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "words.idx")
+            count = WordIndex.build(["zebra", "Apple", "apple", "not a word"], path)
+            words = WordIndex(path)
+
+            self.assertEqual(count, 2)
+            self.assertIn("apple", words)
+            self.assertIn("zebra", words)
+            self.assertNotIn("mango", words)
+
+    def test_if_similar_names_are_generated(self):
+        names = similar_names("bookstore", 20)
+
+        self.assertLessEqual(len(names), 20)
+        self.assertNotIn("bookstore", names)
+        self.assertEqual(names[:2], ["book", "store"])
+        self.assertIn("bookstores", names)
+        self.assertTrue(all(is_valid_name(name) for name in names))
+
+    @override_settings(DOMAIN_FINDER={"SIMILAR_NAMES_SOURCE": "local"})
+    def test_if_datamuse_is_not_queried(self):
+        with mock.patch.object(datamuse, "suggestions") as suggestions:
+            names = asyncio.run(engine._similar_names("phone"))
+
+        suggestions.assert_not_called()
+        self.assertIn("phones", names)
+
+
+class BatchWriterTestCase(SimpleTestCase):
+    def test_if_flush_waits_for_the_batch_being_written(self):
+        written = []
+        writing = threading.Event()
+
+        def write(batch):
+            if not writing.is_set():
+                writing.set()
+                time.sleep(0.05)
+            written.extend(batch)
+
+        writer = BatchWriter(write, batch_size=2, interval=60)
+        writer.add(1)
+        writer.add(2)
+        writing.wait(1)
+        writer.add(3)
+        writer.flush()
+
+        self.assertEqual(written, [1, 2, 3])
+
+    def test_if_write_errors_are_raised_by_flush(self):
+        def write(batch):
+            raise DatabaseError()
+
+        writer = BatchWriter(write, batch_size=1, interval=60)
+        with self.assertLogs("api.writer"):
+            writer.add(1)
+            with self.assertRaises(DatabaseError):
+                writer.flush()
+        writer.flush()
+
+
+class LookupStoreTestCase(TransactionTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.store = LookupStore(batch_size=100, interval=60)
+        get_result_cache().local.clear()
+
+    def _store(self, name, registered, age, expires_on=None):
+        LookupResult.objects.create(
+            name=name,
+            tld="com",
+            registered=registered,
+            checked_at=timezone.now() - datetime.timedelta(seconds=age),
+            source="whois",
+            expires_on=expires_on,
+        )
+
+    def test_if_answers_are_upserted(self):
+        self.store.save("Google", "com", Registration(False, None, "whois"))
+        self.store.save("google", "com", Registration(True, None, "whois"))
+        self.store.flush()
+
+        registered, ttl = asyncio.run(self.store.get("google", "com"))
+        self.assertTrue(registered)
+        self.assertGreater(ttl, 0)
+        self.assertEqual(LookupResult.objects.count(), 1)
+
+    @override_settings(DOMAIN_FINDER={"CACHE_AVAILABLE_TTL": 60})
+    def test_if_stale_answers_are_not_read(self):
+        self._store("hqweyvzdiohqwuetybasas", False, age=120)
+        self._store("google", True, age=0, expires_on=datetime.date(2000, 1, 1))
+
+        self.assertIsNone(asyncio.run(self.store.get("hqweyvzdiohqwuetybasas", "com")))
+        self.assertIsNone(asyncio.run(self.store.get("google", "com")))
+
+    @override_settings(DOMAIN_FINDER={"CACHE_AVAILABLE_TTL": 60})
+    def test_if_stale_and_expiring_answers_are_refreshed(self):
+        self._store("fresh", True, age=120)
+        self._store("stale", False, age=120)
+        self._store("expiring", True, age=120, expires_on=datetime.date.today())
+
+        self.assertEqual(
+            sorted(result.name for result in stale_results(expiring_within=30)),
+            ["expiring", "stale"],
+        )
+
+    @override_settings(DOMAIN_FINDER={"CACHE_AVAILABLE_TTL": 60, "LOOKUP_STORE": True})
+    def test_if_stale_answers_are_refreshed_in_chunks(self):
+        for i in range(5):
+            self._store(f"stale{i}", False, age=120 + i)
+        refreshed = []
+
+        async def refresh(name, tld):
+            refreshed.append(name)
+            if name == "stale0":
+                raise ConnectionResetError()
+            return False
+
+        with mock.patch.object(engine, "refresh", refresh):
+            call_command("refresh_lookups", chunk_size=2, limit=4, stdout=mock.Mock())
+
+        self.assertEqual(refreshed, ["stale4", "stale3", "stale2", "stale1"])
+
+    @override_settings(DOMAIN_FINDER={"LOOKUP_STORE": True})
+    def test_if_stored_answers_are_read_before_lookups(self):
+        self._store("google", True, age=0)
+
+        with mock.patch.object(engine, "get_backend") as backend:
+            self.assertTrue(asyncio.run(engine.whois_query("google", "com")))
+        backend.assert_not_called()
+
+
+class SearchJobsTestCase(TransactionTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(username="searcher")
+        self.client.force_authenticate(self.user)
+        self.endpoint_url = "/api/v1/similarDomains/jobs"
+
+    def test_if_job_is_queued(self):
+        response = self.client.post(
+            self.endpoint_url, {"domain": "google.com", "tlds": ["net"]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], SearchJob.PENDING)
+        self.assertEqual(SearchJob.objects.get().tlds, ["net"])
+
+    def test_if_unsupported_tlds_are_rejected(self):
+        response = self.client.post(
+            self.endpoint_url, {"domain": "google.com", "tlds": ["zz"]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(DOMAIN_FINDER={"SIMILAR_TLDS": ["org", "net"]})
+    def test_if_similar_tlds_are_the_default(self):
+        response = self.client.post(
+            self.endpoint_url, {"domain": "google.com"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(SearchJob.objects.get().tlds, ["org", "net"])
+
+    def test_if_anonymous_users_are_rejected(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(
+            self.endpoint_url, {"domain": "google.com"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(DOMAIN_FINDER={"JOB_SUBMIT_RATE": "1/hour"})
+    def test_if_job_submissions_are_throttled(self):
+        caches["default"].clear()
+        statuses = [
+            self.client.post(
+                self.endpoint_url, {"domain": "google.com"}, format="json"
+            ).status_code
+            for _ in range(2)
+        ]
+
+        self.assertEqual(
+            statuses,
+            [status.HTTP_202_ACCEPTED, status.HTTP_429_TOO_MANY_REQUESTS],
+        )
+
+    def test_if_results_are_returned_after_the_job_ran(self):
+        async def whois_query(name, tld):
+            if name == "gogle":
+                raise OSError
+            return name == "google"
+
+        async def similar_names(name, limit=None):
+            return ["gogle"]
+
+        job = jobs.submit(self.user, "google", "com", ["com", "net"])
+        with mock.patch.object(engine, "whois_query", whois_query), mock.patch.object(
+            engine, "_similar_names", similar_names
+        ):
+            jobs.work(max_jobs=1)
+
+        response = self.client.get(f"{self.endpoint_url}/{job.id}")
+
+        self.assertEqual(response.data["status"], SearchJob.DONE)
+        self.assertEqual(
+            response.data["similar"],
+            [{"name": "google", "tld": "net", "registered": True}],
+        )
+        self.assertEqual(
+            response.data["failed"],
+            [{"name": "gogle", "tld": "net", "reason": "error"}],
+        )
+
+        response = self.client.get(
+            f"{self.endpoint_url}/{job.id}?after={response.data['next']}"
+        )
+        self.assertEqual(response.data["similar"] + response.data["failed"], [])
+
+    def test_if_job_fails_when_its_results_are_not_written(self):
+        async def whois_query(name, tld):
+            return False
+
+        async def similar_names(name, limit=None):
+            return []
+
+        def write(batch):
+            raise DatabaseError()
+
+        job = jobs.submit(self.user, "google", "com", ["net"])
+        writer = BatchWriter(write, batch_size=10, interval=60)
+        with mock.patch.object(engine, "whois_query", whois_query), mock.patch.object(
+            engine, "_similar_names", similar_names
+        ), mock.patch.object(jobs, "_result_writer", return_value=writer):
+            with self.assertLogs("api"):
+                jobs.work(max_jobs=1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, SearchJob.FAILED)
+
+    def test_if_jobs_of_other_users_are_not_found(self):
+        other = get_user_model().objects.create(username="other", email="o@o.com")
+        job = jobs.submit(other, "google", "com", ["net"])
+
+        for url in (
+            f"{self.endpoint_url}/{job.id}",
+            f"{self.endpoint_url}/{job.id}/stream",
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, url)
+
+    def test_if_jobs_require_authentication(self):
+        job = jobs.submit(self.user, "google", "com", ["net"])
+        self.client.force_authenticate(None)
+
+        for url in (
+            f"{self.endpoint_url}/{job.id}",
+            f"{self.endpoint_url}/{job.id}/stream",
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED, url)
+
+
+class TLDPlanTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.hit_rates = tldplan.HitRates()
+        self.latencies = policy.LatencyTracker()
+        patches = [
+            mock.patch.object(tldplan, "hit_rates", self.hit_rates),
+            mock.patch.object(policy, "latencies", self.latencies),
+            mock.patch.object(tldplan, "_probed_at", {}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_if_tlds_are_not_modified(self):
+        tlds = ["com", "org", "net"]
+
+        self.assertEqual(tldplan.plan("com", tlds, names=1), ["org", "net"])
+        self.assertEqual(tldplan.plan("com", tlds, names=1), ["org", "net"])
+        self.assertEqual(tlds, ["com", "org", "net"])
+
+    def test_if_tlds_are_ranked_by_hit_rate(self):
+        for _ in range(10):
+            self.hit_rates.record("org", False)
+            self.hit_rates.record("dev", True)
+
+        self.assertEqual(
+            tldplan.plan("com", ["org", "net", "dev"], names=1), ["dev", "net", "org"]
+        )
+
+    def test_if_slow_tlds_are_dropped(self):
+        for _ in range(10):
+            self.latencies.record(whois_server("org"), 10)
+
+        self.assertEqual(
+            tldplan.plan("com", ["org", "net", "dev"], names=1, budget=5),
+            ["net", "dev"],
+        )
+
+    def test_if_dropped_tlds_are_probed_now_and_then(self):
+        for _ in range(10):
+            self.latencies.record(whois_server("org"), 10)
+        tlds = ["org", "net", "dev"]
+
+        kept = tldplan.plan("com", tlds, names=1, budget=5)
+
+        self.assertEqual(tldplan.probes("com", tlds, kept), ["org"])
+        self.assertEqual(tldplan.probes("com", tlds, kept), [])
+
+    @override_settings(
+        DOMAIN_FINDER={
+            "WHOIS_SERVER_CONCURRENCY": 10,
+            "WHOIS_SERVER_RATE": 10,
+            "WHOIS_SERVER_BURST": 10,
+        }
+    )
+    def test_if_concurrent_plans_share_a_server(self):
+        for tld in ("org", "net"):
+            for _ in range(10):
+                self.latencies.record(whois_server(tld), 0.5)
+
+        async def plan_twice():
+            first = tldplan.plan("com", ["org", "net"], names=40, budget=5)
+
+            # the lookups of the first plan are queued when the second plans
+            async def lookup(tld):
+                async with get_scheduler().slot(tld):
+                    await asyncio.sleep(5)
+
+            lookups = [
+                asyncio.ensure_future(lookup(tld)) for tld in first for _ in range(40)
+            ]
+            await asyncio.sleep(0)
+            second = tldplan.plan("com", ["org", "net"], names=40, budget=5)
+            for queued in lookups:
+                queued.cancel()
+            await asyncio.gather(*lookups, return_exceptions=True)
+            return first, second
+
+        first, second = asyncio.run(plan_twice())
+
+        self.assertEqual(first, ["org", "net"])
+        self.assertEqual(second, ["org"])
+
+
+class MetricsTestCase(SimpleTestCase):
+    def test_if_histogram_is_rendered_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Test", ["tld"], buckets=(1, 5))
+        metrics.REGISTRY.remove(histogram)
+        histogram.observe(0.5, tld="com")
+        histogram.observe(3, tld="com")
+
+        self.assertEqual(
+            histogram.samples(),
+            [
+                'test_seconds_bucket{tld="com",le="1"} 1',
+                'test_seconds_bucket{tld="com",le="5"} 2',
+                'test_seconds_bucket{tld="com",le="+Inf"} 2',
+                'test_seconds_sum{tld="com"} 3.5',
+                'test_seconds_count{tld="com"} 2',
+            ],
+        )
+
+    def test_if_metrics_are_exposed(self):
+        metrics.LOOKUP_ERRORS.inc(tld="com", server="whois.test", error="OSError")
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            'domain_finder_lookup_errors_total{tld="com",server="whois.test",'
+            'error="OSError"}',
+            response.content.decode(),
+        )
+
+    def test_if_metrics_of_the_host_are_summed(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        metrics.LOOKUP_RETRIES.inc(server="whois.shared.test")
+        metrics.LOOKUP_DURATION.observe(0.2, tld="com", server="whois.shared.test")
+        mine = metrics.LOOKUP_RETRIES.snapshot()[("whois.shared.test",)]
+        # the parent runs the tests too, a process that exited is dropped
+        other = {
+            metrics.LOOKUP_RETRIES.name: [[["whois.shared.test"], 2]],
+            metrics.LOOKUP_DURATION.name: [
+                [["com", "whois.shared.test"], [[0] * 9 + [1] * 3, 1, 3.0]]
+            ],
+        }
+        path = os.path.join(directory.name, "metrics")
+        os.makedirs(path)
+        with open(os.path.join(path, f"{os.getppid()}.json"), "w") as file:
+            json.dump(other, file)
+        with open(os.path.join(path, "999999999.json"), "w") as file:
+            json.dump(other, file)
+
+        with self.settings(DOMAIN_FINDER={"SHARED_STATE_DIR": directory.name}):
+            rendered = metrics.render()
+
+        self.assertIn(
+            f'domain_finder_lookup_retries_total{{server="whois.shared.test"}} '
+            f"{mine + 2}",
+            rendered,
+        )
+        self.assertIn(
+            'domain_finder_lookup_seconds_bucket{tld="com",server="whois.shared.test",'
+            'le="+Inf"} 2',
+            rendered,
+        )
+        self.assertFalse(os.path.exists(os.path.join(path, "999999999.json")))
+
+    def test_if_concurrent_exports_dont_collide(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name)
+        errors = []
+
+        def export():
+            try:
+                for _ in range(50):
+                    metrics.export(path)
+            except OSError as exc:
+                errors.append(exc)
+
+        # as the export thread and render() would
+        threads = [threading.Thread(target=export) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(path), [f"{os.getpid()}.json"])
+
+    @override_settings(DOMAIN_FINDER={"TIMING_HEADER": True})
+    def test_if_timing_header_is_added(self):
+        with mock.patch.object(
+            engine, "whois_query", mock.AsyncMock(return_value=True)
+        ):
+            response = self.client.get("/api/v1/registrationStatus?domain=google.com")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response["Server-Timing"], r"lookup;dur=[\d.]+")
+
+
+class BenchmarkTestCase(SimpleTestCase):
+    def test_if_whois_backend_queries_fake_server(self):
+        async def lookup(name):
+            server = benchmark.FakeWhoisServer(latency=0)
+            address = await server.start()
+            try:
+                with self.settings(DOMAIN_FINDER={"WHOIS_ADDRESSES": {"*": address}}):
+                    registration = await WhoisBackend().lookup(name, "com")
+            finally:
+                await server.stop()
+            return registration, server
+
+        for name in ("google", "hqweyvzdiohqwuetybasas"):
+            registration, server = asyncio.run(lookup(name))
+            self.assertEqual(server.queries, 1)
+            if server.is_registered(f"{name}.com"):
+                self.assertEqual(
+                    registration, Registration(True, datetime.date(2030, 1, 1), "whois")
+                )
+            else:
+                self.assertEqual(registration, Registration(False, None, "whois"))
+
+    def test_if_stop_cancels_open_connections(self):
+        async def stop():
+            server = benchmark.FakeWhoisServer(latency=0)
+            host, port = (await server.start()).split(":")
+            # connected, but the query never comes
+            _, writer = await asyncio.open_connection(host, int(port))
+            await asyncio.sleep(0.01)
+
+            await asyncio.wait_for(server.stop(), 1)
+            writer.close()
+            return asyncio.all_tasks() - {asyncio.current_task()}
+
+        self.assertEqual(asyncio.run(stop()), set())
+
+    def test_if_regressions_are_reported(self):
+        baseline = {"scenarios": {"engine": {"throughput": 100, "p95": 50}}}
+        report = {"scenarios": {"engine": {"throughput": 95, "p95": 80}}}
+
+        self.assertEqual(
+            benchmark.compare(baseline, report, tolerance=0.1),
+            ["engine p95: 50.00 -> 80.00 (+60%)"],
+        )
+
+    def test_if_percentile_is_nearest_rank(self):
+        samples = list(range(1, 101))
+
+        self.assertEqual(benchmark.percentile(samples, 0.5), 50)
+        self.assertEqual(benchmark.percentile(samples, 0.99), 99)
+        self.assertIsNone(benchmark.percentile([], 0.5))
+
+
+class RenderingTestCase(SimpleTestCase):
+    def test_if_similar_domains_are_rendered(self):
+        similar = [engine.DomainResult("googles", "net", False)]
+        failed = [engine.LookupFailure("googles", "org", engine.LookupFailure.TIMEOUT)]
+        with mock.patch.object(
+            engine, "whois_query", mock.AsyncMock(return_value=True)
+        ), mock.patch.object(
+            engine, "similar_domains", mock.AsyncMock(return_value=(similar, failed))
+        ):
+            response = self.client.get("/api/v1/similarDomains?domain=google.com")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json(),
+            {
+                "domain": {"name": "google", "tld": "com", "registered": True},
+                "similar": [{"name": "googles", "tld": "net", "registered": False}],
+                "failed": [{"name": "googles", "tld": "org", "reason": "timeout"}],
+            },
+        )
+
+    def test_if_errors_match_serializer(self):
+        with mock.patch.object(
+            engine, "whois_query", mock.AsyncMock(return_value=False)
+        ):
+            response = self.client.get("/api/v1/registrationStatus?domain=a_b.zzzz")
+
+        serializer = DomainSerializer(
+            data={"name": "a_b", "tld": "zzzz", "registered": False}
+        )
+        serializer.is_valid()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), json.loads(json.dumps(serializer.errors)))
+
+    def test_if_lazy_strings_are_rendered(self):
+        rendered = FastJSONRenderer().render({"tld": [TLD_ERROR]})
+
+        self.assertEqual(json.loads(rendered), {"tld": ["TLD not supported"]})
+
+    @skipUnless(renderers.ORJSON, "orjson isn't installed")
+    def test_if_fallback_matches_orjson(self):
+        data = {
+            "domain": {"name": "bücher", "tld": "de", "registered": None},
+            "similar": [{"name": "googles", "tld": "net", "registered": False}],
+            "next": 42,
+            "tld": [TLD_ERROR],
+        }
+        fast = renderers.dumps(data)
+
+        with mock.patch.object(renderers, "ORJSON", False):
+            self.assertEqual(renderers.dumps(data).encode(), fast.encode())
+
+
+class ZoneIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "com.bloom")
+        settings = self.settings(
+            DOMAIN_FINDER={"ZONE_INDEX_DIR": directory.name, "LOOKUP_STORE": False}
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        zones.get_zone_index.cache_clear()
+        self.addCleanup(zones.get_zone_index.cache_clear)
+
+    def test_if_zone_files_are_read(self):
+        lines = [
+            "$ORIGIN com.\n",
+            "com. 900 IN SOA a.gtld-servers.net. nstld.verisign-grs.com. 1 2 3 4 5\n",
+            "GOOGLE NS NS1.GOOGLE.COM.\n",
+            "GOOGLE NS NS2.GOOGLE.COM.\n",
+            "\tNS NS3.GOOGLE.COM.\n",
+            "example.com. 172800 IN NS a.iana-servers.net.\n",
+        ]
+
+        self.assertEqual(list(zones.zone_names(lines, "com")), ["google", "example"])
+
+    def test_if_names_are_added_incrementally(self):
+        names = [f"name{i}" for i in range(1000)]
+        zones.ZoneIndex.create(self.path, len(names) + 1, 0.01).add(names)
+        zones.ZoneIndex(self.path, writable=True).add(["google"])
+
+        index = zones.ZoneIndex(self.path)
+        self.assertEqual(index.count, 1001)
+        self.assertTrue(all(name in index for name in names + ["google"]))
+        false_positives = sum(f"other{i}" in index for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+    def test_if_names_in_zone_are_registered_without_lookup(self):
+        zones.ZoneIndex.create(self.path, 10, 0.001).add(["google"])
+        get_result_cache().local.clear()
+
+        backend = mock.Mock()
+        backend.lookup = mock.AsyncMock(return_value=Registration(False, None, "whois"))
+        with mock.patch.object(engine, "get_backend", return_value=backend):
+            self.assertTrue(asyncio.run(engine.whois_query("Google", "com")))
+            self.assertFalse(
+                asyncio.run(engine.whois_query("hqweyvzdiohqwuetybasas", "com"))
+            )
+
+        backend.lookup.assert_awaited_once_with(
+            "hqweyvzdiohqwuetybasas", "com", details=False
+        )
+        self.assertLessEqual(
+            engine.freshness("google", "com"), get_setting("ZONE_INDEX_TTL")
+        )
+
+    def test_if_names_in_zone_are_confirmed_by_precheck(self):
+        zones.ZoneIndex.create(self.path, 10, 0.001).add(["google", "lapsed"])
+        get_result_cache().local.clear()
+        self.addCleanup(get_result_cache().local.clear)
+
+        backend = mock.Mock()
+        backend.lookup = mock.AsyncMock(return_value=Registration(False, None, "whois"))
+        delegated = {"google": True, "lapsed": False}
+
+        async def is_delegated(name, tld):
+            return delegated[name]
+
+        with mock.patch.object(
+            engine, "get_backend", return_value=backend
+        ), mock.patch.object(
+            engine.resolver, "is_delegated", is_delegated
+        ), self.settings(
+            DOMAIN_FINDER={
+                "ZONE_INDEX_DIR": os.path.dirname(self.path),
+                "LOOKUP_STORE": False,
+                "DNS_PRECHECK": True,
+            }
+        ):
+            self.assertTrue(asyncio.run(engine.whois_query("google", "com")))
+            self.assertFalse(asyncio.run(engine.whois_query("lapsed", "com")))
+
+        backend.lookup.assert_awaited_once_with("lapsed", "com", details=False)
+
+
+class WhoisClientTestCase(SimpleTestCase):
+    def test_if_registry_signature_is_used(self):
+        available = whoisclient.WhoisAnswer(
+            "whois.verisign-grs.com", 'No match for "HQWEYVZDIOHQWUETYBASAS.COM".\r\n'
+        )
+        registered = whoisclient.WhoisAnswer(
+            "whois.verisign-grs.com",
+            "Domain Name: GOOGLE.COM\r\n"
+            "NOTICE: if a domain is not found here, ask the registrar\r\n",
+        )
+
+        self.assertTrue(available.available)
+        self.assertFalse(registered.available)
+
+    def test_if_other_servers_use_generic_checks(self):
+        answer = whoisclient.WhoisAnswer("whois.example", "%% No entries found\n")
+
+        self.assertTrue(answer.available)
+
+    def test_if_answer_is_parsed_only_for_details(self):
+        async def lookup(details):
+            server = benchmark.FakeWhoisServer(latency=0, registered=1)
+            address = await server.start()
+            try:
+                with self.settings(DOMAIN_FINDER={"WHOIS_ADDRESSES": {"*": address}}):
+                    return await WhoisBackend().lookup("google", "com", details)
+            finally:
+                await server.stop()
+
+        with mock.patch.object(
+            whoisclient, "_parse", wraps=whoisclient._parse
+        ) as parse:
+            self.assertEqual(
+                asyncio.run(lookup(details=False)), Registration(True, None, "whois")
+            )
+            parse.assert_not_called()
+
+            self.assertEqual(
+                asyncio.run(lookup(details=True)),
+                Registration(True, datetime.date(2030, 1, 1), "whois"),
+            )
+            parse.assert_called_once()
+
+
+class SharedStateTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_if_cache_is_shared_between_mappings(self):
+        path = os.path.join(self.directory, "results")
+        # as two workers would open it
+        first, second = HostCache(path, 64), HostCache(path, 64)
+        first.set("google.com", True, 60)
+        first.set("google.org", False, 0)
+
+        value, expires_at = second.get("google.com")
+        self.assertIs(value, True)
+        self.assertGreater(expires_at, time.time())
+        self.assertIsNone(second.get("google.org"))
+        self.assertIsNone(second.get("google.net"))
+
+    def test_if_torn_records_are_misses(self):
+        cache = HostCache(os.path.join(self.directory, "results"), 1)
+        cache.set("google.com", True, 60)
+        # a byte of the digest overwritten by another writer
+        for offset in range(cache.HEADER.size, len(cache._map), cache.RECORD.size):
+            cache._map[offset] ^= 0xFF
+
+        self.assertIsNone(cache.get("google.com"))
+
+    def test_if_rate_budget_is_shared(self):
+        path = os.path.join(self.directory, "rate_limits")
+        first, second = SharedRateLimits(path, 16), SharedRateLimits(path, 16)
+
+        self.assertEqual(first.take("whois.test", rate=1, capacity=2), 0)
+        self.assertEqual(second.take("whois.test", rate=1, capacity=2), 0)
+        self.assertGreater(first.take("whois.test", rate=1, capacity=2), 0)
+        self.assertEqual(second.take("whois.other", rate=1, capacity=2), 0)
+
+    def test_if_resized_table_is_another_file(self):
+        path = os.path.join(self.directory, "results")
+        live = HostCache(path, 64)
+        live.set("google.com", True, 60)
+        size = os.path.getsize(live.path)
+
+        resized = HostCache(path, 1024)
+
+        self.assertNotEqual(resized.path, live.path)
+        self.assertEqual(os.path.getsize(live.path), size)
+        self.assertIs(live.get("google.com")[0], True)
+        self.assertIsNone(resized.get("google.com"))
+        self.assertEqual(
+            sorted(os.listdir(self.directory)), ["results.1024", "results.64"]
+        )
+
+    def test_if_host_cache_fills_local_one(self):
+        host = HostCache(os.path.join(self.directory, "results"), 64)
+        host.set("google.com", True, 60)
+        cache = ResultCache(LRUCache(maxsize=2), host=host)
+
+        self.assertIs(cache.get("google.com"), True)
+        self.assertIs(cache.local.get("google.com"), True)
+
+
+class WarmUpTestCase(SimpleTestCase):
+    def test_if_hot_names_are_cached(self):
+        async def warm_up():
+            server = benchmark.FakeWhoisServer(latency=0, registered=1)
+            address = await server.start()
+            try:
+                with self.settings(
+                    DOMAIN_FINDER={
+                        "WHOIS_ADDRESSES": {"*": address},
+                        "SIMILAR_TLDS": ["com", "org"],
+                        "CACHE_ALIAS": None,
+                        "LOOKUP_STORE": False,
+                    }
+                ):
+                    return await warmup.warm_up(["google"]), server.queries
+            finally:
+                await server.stop()
+
+        get_result_cache().local.clear()
+        self.addCleanup(get_result_cache().local.clear)
+        report, queries = asyncio.run(warm_up())
+
+        self.assertEqual(report["lookups"], 2)
+        self.assertEqual(report["failed"], 0)
+        self.assertEqual(queries, 2)
+        self.assertIs(get_result_cache().get("google.org"), True)
+
+    def test_if_configured_names_come_first(self):
+        with self.settings(
+            DOMAIN_FINDER={"WARMUP_NAMES": ["google", "not valid", "google"]}
+        ):
+            self.assertEqual(warmup.hot_names(limit=0), ["google"])
+
+    def test_if_hot_names_query_is_bounded_by_deadline(self):
+        def hot_names():
+            time.sleep(0.5)
+            return ["google"]
+
+        with mock.patch.object(warmup, "hot_names", hot_names), self.settings(
+            DOMAIN_FINDER={"WARMUP_DEADLINE": 0.05}
+        ):
+            report = asyncio.run(warmup.warm_up())
+
+        self.assertEqual(report["names"], 0)
+        self.assertLess(report["seconds"], 0.4)
+
+    def test_if_server_starts_after_warm_up(self):
+        async def application(scope, receive, send):
+            raise AssertionError("lifespan events aren't passed on")
+
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        async def warm_up():
+            sent.append("warm up")
+
+        with mock.patch.object(warmup, "_warm_up_logged", warm_up):
+            asyncio.run(
+                warmup.with_warm_up(application)({"type": "lifespan"}, receive, send)
+            )
+
+        self.assertEqual(
+            sent,
+            ["warm up", "lifespan.startup.complete", "lifespan.shutdown.complete"],
+        )
+
+    def test_if_wsgi_warm_up_is_opt_in(self):
+        warm_up = mock.AsyncMock()
+
+        with mock.patch.object(warmup, "_warm_up_logged", warm_up):
+            warmup.warm_up_wsgi()
+            warm_up.assert_not_called()
+            with self.settings(DOMAIN_FINDER={"WARMUP_WSGI": True}):
+                warmup.warm_up_wsgi()
+        warm_up.assert_awaited_once()
+
+
+class WarmUpHistoryTestCase(TransactionTestCase):
+    def test_if_only_recent_searches_are_counted(self):
+        user = get_user_model().objects.create(username="searcher")
+        now = timezone.now()
+        for domain, days in [("old.com", 30), ("old.com", 30), ("new.com", 1)]:
+            SearchHistory.objects.create(
+                user=user, domain=domain, searched_at=now - datetime.timedelta(days)
+            )
+
+        with self.settings(DOMAIN_FINDER={"WARMUP_HISTORY_DAYS": 7}):
+            self.assertEqual(warmup.hot_names(limit=5), ["new"])
+
+
+class StartupTestCase(SimpleTestCase):
+    # seconds a fresh process may take to boot and serve its first request,
+    # well over what it takes so that slow machines don't fail it
+    COLD_START_BUDGET = 3
+
+    def test_if_cold_start_is_within_budget(self):
+        report = startup.profile("/metrics", warm_up=False)
+
+        self.assertEqual(report["status"], 200)
+        for phase in startup.PHASES:
+            loaded = {module.split(".")[0] for module in report[phase]["imports"]}
+            self.assertFalse(loaded & set(startup.LAZY_MODULES), phase)
+        self.assertLess(
+            sum(report[phase]["seconds"] for phase in startup.PHASES),
+            self.COLD_START_BUDGET,
+        )
+
+    def test_if_lazy_modules_are_imported_before_first_lookup(self):
+        backend = RDAPBackend()
+
+        with mock.patch.object(backends.importlib, "import_module") as import_module:
+            backend.prepare()
+
+        imported = [call.args[0] for call in import_module.call_args_list]
+        self.assertIn("httpx", imported)
+        self.assertIn("asyncwhois", imported)
+
+
+class ResponseCacheTestCase(SimpleTestCase):
+    url = "/api/v1/registrationStatus?domain=hqweyvzdiohqwuetybasas.com"
+
+    def setUp(self):
+        for cache in (get_response_cache(), get_result_cache().local):
+            cache.clear()
+            self.addCleanup(cache.clear)
+
+        def whois_query(name, tld):
+            # cached as the engine does, responses expire with the answers
+            registered = self.whois_query.return_value
+            get_result_cache().set(f"{name}.{tld}", registered, result_ttl(registered))
+            return registered
+
+        patcher = mock.patch.object(
+            engine,
+            "whois_query",
+            mock.AsyncMock(return_value=False, side_effect=whois_query),
+        )
+        self.whois_query = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_if_repeat_lookups_are_cached(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+
+        self.whois_query.assert_awaited_once()
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(first["Cache-Control"], "public, max-age=3600")
+
+    def test_if_responses_expire_with_the_answers_they_hold(self):
+        get_result_cache().local.set("hqweyvzdiohqwuetybasas.com", False, 100)
+        self.whois_query.side_effect = None
+
+        response = self.client.get(
+            "/api/v1/registrationStatus?domain=HQWEYVZDIOHQWUETYBASAS.com"
+        )
+        again = self.client.get(self.url)
+
+        self.assertEqual(response["Cache-Control"], "public, max-age=100")
+        self.assertEqual(again.json()["name"], "hqweyvzdiohqwuetybasas")
+        self.whois_query.assert_awaited_once()
+
+    def test_if_current_copies_are_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        current = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        outdated = self.client.get(self.url, HTTP_IF_NONE_MATCH='W/"outdated"')
+
+        self.assertEqual(current.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(current.content, b"")
+        self.assertEqual(current["ETag"], etag)
+        self.assertEqual(outdated.status_code, status.HTTP_200_OK)
+
+    def test_if_cached_searches_are_recorded(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model()(pk=1, username="someuser"))
+
+        with mock.patch.object(history, "record") as record:
+            client.get(self.url)
+            response = client.get(self.url)
+
+        self.whois_query.assert_awaited_once()
+        self.assertEqual(record.call_count, 2)
+        self.assertEqual(response["Cache-Control"], "private, max-age=3600")
+        self.assertIn("Authorization", response["Vary"])
+
+    def test_if_similar_domains_expire_with_their_first_answer(self):
+        url = "/api/v1/similarDomains?domain=google.com"
+        similar = [engine.DomainResult("googles", "net", False)]
+        failed = [engine.LookupFailure("googles", "org", engine.LookupFailure.TIMEOUT)]
+        self.whois_query.return_value = True
+        get_result_cache().set("googles.net", False, result_ttl(False))
+
+        with mock.patch.object(
+            engine, "similar_domains", mock.AsyncMock(return_value=(similar, []))
+        ):
+            complete = self.client.get(url)
+        get_response_cache().clear()
+        with mock.patch.object(
+            engine, "similar_domains", mock.AsyncMock(return_value=(similar, failed))
+        ):
+            partial = self.client.get(url)
+            self.client.get(url)
+
+        self.assertEqual(complete["Cache-Control"], "public, max-age=3600")
+        self.assertEqual(partial["Cache-Control"], "public, max-age=0")
+        self.assertEqual(self.whois_query.await_count, 3)
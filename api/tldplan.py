@@ -0,0 +1,143 @@
+"""Chooses the TLDs similar names are looked up in, and their order"""
+import math
+import time
+from collections import defaultdict, deque
+from typing import List
+
+from . import policy
+from .conf import get_setting
+from .scheduler import backlog, server_limits, whois_server
+
+# seconds a lookup is assumed to take until enough were recorded
+DEFAULT_LATENCY = 1.0
+LATENCY_MIN_SAMPLES = 5
+
+
+class HitRates:
+    """
+    Keeps whether the most recent lookups per TLD found the domain available.
+
+    Attributes:
+        size (int): the number of lookups kept per TLD
+        prior (float): the hit rate assumed before anything was recorded, it
+            weighs as much as `prior_weight` lookups
+    """
+
+    def __init__(self, size: int = 500, prior: float = 0.5, prior_weight: int = 4):
+        self.size = size
+        self.prior = prior
+        self.prior_weight = prior_weight
+        self._hits = defaultdict(lambda: deque(maxlen=self.size))
+
+    def record(self, tld: str, available: bool):
+        """Records the answer of a lookup in `tld`."""
+        self._hits[tld.lower()].append(available)
+
+    def rate(self, tld: str) -> float:
+        """Returns the share of recent lookups in `tld` that were available."""
+        hits = self._hits.get(tld.lower(), ())
+        return (sum(hits) + self.prior * self.prior_weight) / (
+            len(hits) + self.prior_weight
+        )
+
+
+hit_rates = HitRates()
+
+# server -> when a tld of it left out by plan was last probed, see probes
+_probed_at = {}
+
+
+def plan(tld: str, tlds: List[str], names: int, budget: float = None) -> List[str]:
+    """
+    Ranks the TLDs to look similar names up in, and drops the ones that
+    wouldn't answer within the budget.
+
+    TLDs are ranked by the available names they're expected to find per
+    second: their recent hit rate over the latency of their WHOIS server.
+    Ties keep the order of `tlds`. The queries other requests already queued
+    on a server count against the budget of its tlds.
+
+    Args:
+        tld (str): the tld of the domain, it's left out
+        tlds (List[str]): the candidate tlds, never modified
+        names (int): the number of names looked up in every tld
+        budget (float): seconds the lookups should take, None keeps every tld
+
+    Returns:
+        A new list of tlds, best first. The best one is kept whatever the budget.
+    """
+    candidates = [
+        candidate
+        for candidate in dict.fromkeys(candidate.lower() for candidate in tlds)
+        if candidate != tld.lower()
+    ]
+    ranked = sorted(candidates, key=lambda t: -hit_rates.rate(t) / latency(t))
+    if budget is None:
+        return ranked
+
+    kept = []
+    # tlds sharing a server share its rate limit, with the other requests
+    lookups = {}
+    for candidate in ranked:
+        server = whois_server(candidate)
+        if server not in lookups:
+            lookups[server] = backlog(server)
+        if not kept or expected_duration(server, lookups[server] + names) <= budget:
+            lookups[server] += names
+            kept.append(candidate)
+    return kept
+
+
+def probes(tld: str, tlds: List[str], kept: List[str]) -> List[str]:
+    """
+    Returns the tlds `plan` left out whose server is due a probe: a single
+    lookup, so that its latency is measured again and its tlds come back
+    once it recovers. A server is probed at most every
+    SIMILAR_TLD_PROBE_INTERVAL seconds.
+
+    Args:
+        tld (str): the tld of the domain, it's left out
+        tlds (List[str]): the tlds given to `plan`
+        kept (List[str]): the tlds `plan` returned
+    """
+    now = time.monotonic()
+    interval = get_setting("SIMILAR_TLD_PROBE_INTERVAL")
+    # the lookups of kept tlds measure their server already
+    measured = {whois_server(candidate) for candidate in kept}
+    due = []
+    for candidate in dict.fromkeys(candidate.lower() for candidate in tlds):
+        server = whois_server(candidate)
+        if candidate == tld.lower() or server in measured:
+            continue
+        probed_at = _probed_at.get(server)
+        if probed_at is None or now - probed_at >= interval:
+            _probed_at[server] = now
+            measured.add(server)
+            due.append(candidate)
+    return due
+
+
+def latency(tld: str) -> float:
+    """Returns the median latency of recent lookups to the server of `tld`."""
+    return _server_latency(whois_server(tld))
+
+
+def expected_duration(server: str, lookups: int) -> float:
+    """
+    Estimates the seconds `lookups` lookups to `server` take, given its
+    latency and the limits the scheduler puts on it. The queries already
+    queued on the server should be counted in `lookups`.
+    """
+    limits = server_limits(server)
+    median = _server_latency(server)
+
+    # bounded by the lookups in flight at once, and by the rate of new ones
+    waves = math.ceil(lookups / limits["CONCURRENCY"]) * median
+    throttled = max(0, lookups - limits["BURST"]) / limits["RATE"] + median
+    return max(waves, throttled)
+
+
+def _server_latency(server: str) -> float:
+    median = policy.latencies.quantile(server, 0.5, min_samples=LATENCY_MIN_SAMPLES)
+    # ranking divides by it
+    return DEFAULT_LATENCY if median is None else max(median, 0.001)
@@ -1,8 +1,21 @@
 from django.urls import path
 
-from .views import RegistrationStatus, SimilarDomains
+from .views import (
+    BatchRegistrationStatus,
+    RegistrationStatus,
+    SearchJobResults,
+    SearchJobs,
+    SearchJobStream,
+    SimilarDomains,
+    SimilarDomainsStream,
+)
 
 urlpatterns = [
     path("registrationStatus", RegistrationStatus.as_view()),
+    path("registrationStatus/batch", BatchRegistrationStatus.as_view()),
     path("similarDomains", SimilarDomains.as_view()),
+    path("similarDomains/stream", SimilarDomainsStream.as_view()),
+    path("similarDomains/jobs", SearchJobs.as_view()),
+    path("similarDomains/jobs/<uuid:job_id>", SearchJobResults.as_view()),
+    path("similarDomains/jobs/<uuid:job_id>/stream", SearchJobStream.as_view()),
 ]
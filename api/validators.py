@@ -1,22 +1,123 @@
 """Custom validators for the models"""
+import re
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Tuple
+
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
-from whois import TLD_RE
+
+# https://datatracker.ietf.org/doc/html/rfc1034
+MIN_LABEL_LENGTH = 2
+MAX_LABEL_LENGTH = 63
+
+_NAME_RE = re.compile(r"[A-Za-z0-9-]+")
+
+NAME_ERROR = _("Domain name can only contain alphanumeric characters or '-' (hyphen)")
+TLD_ERROR = _("TLD not supported")
 
 
 def domain_name_validator(name):
     """Validates that a domain name consists only of allowed characters"""
-    for ch in name:
-        if not (ch.isalnum() or ch == "-"):
-            raise ValidationError(
-                _(
-                    "Domain name can only contain alphanumeric characters or '-' (hyphen)"
-                ),
-                params={"name": name},
-            )
+    if not is_valid_name(name):
+        raise ValidationError(NAME_ERROR, params={"name": name})
 
 
 def domain_tld_validator(tld):
     """Validates that the TLD is in the list of supported TLDs"""
-    if tld not in [tld.replace("_", ".") for tld in TLD_RE]:
-        raise ValidationError(_("TLD not supported"), params={"tld": tld})
+    if not is_supported_tld(tld):
+        raise ValidationError(TLD_ERROR, params={"tld": tld})
+
+
+def validate_domains(domains: Iterable[Tuple[str, str]]) -> Tuple[List, List]:
+    """
+    Validates many domains at once, as DomainSerializer would.
+
+    Args:
+        domains (Iterable[(str, str)]): (name, tld) pairs
+
+    Returns:
+        (valid, invalid): the valid (name, tld) pairs, and a
+        (name, tld, errors) tuple per invalid one where errors maps the
+        field to its error messages.
+    """
+    # translated once, not per invalid domain
+    name_error, tld_error = str(NAME_ERROR), str(TLD_ERROR)
+
+    valid, invalid = [], []
+    for name, tld in domains:
+        if (
+            MIN_LABEL_LENGTH <= len(name) <= MAX_LABEL_LENGTH
+            and MIN_LABEL_LENGTH <= len(tld) <= MAX_LABEL_LENGTH
+            and is_valid_name(name)
+            and is_supported_tld(tld)
+        ):
+            valid.append((name, tld))
+            continue
+
+        errors = {}
+
+        name_errors = _length_errors(name)
+        if not is_valid_name(name):
+            name_errors.append(name_error)
+        if name_errors:
+            errors["name"] = name_errors
+
+        tld_errors = _length_errors(tld)
+        if not is_supported_tld(tld):
+            tld_errors.append(tld_error)
+        if tld_errors:
+            errors["tld"] = tld_errors
+
+        invalid.append((name, tld, errors))
+
+    return valid, invalid
+
+
+def is_valid_name(name: str) -> bool:
+    """Checks that a domain name consists only of allowed characters"""
+    if _NAME_RE.fullmatch(name):
+        return True
+    if name.isascii():
+        return False
+
+    # internationalized names are valid if their punycode form is
+    try:
+        return bool(_NAME_RE.fullmatch(name.encode("idna").decode("ascii")))
+    except UnicodeError:
+        return False
+
+
+@lru_cache(maxsize=None)
+def get_supported_tlds() -> FrozenSet[str]:
+    """
+    Returns the TLDs python-whois knows, e.g. "com" or "co.uk".
+
+    Note:
+        python-whois is imported on the first call, not with the models, so
+        that commands like `migrate` don't load it.
+    """
+    from whois import TLD_RE  # pylint: disable=import-outside-toplevel
+
+    return frozenset(tld.replace("_", ".") for tld in TLD_RE)
+
+
+def is_supported_tld(tld: str) -> bool:
+    """Checks that the TLD is in the list of supported TLDs"""
+    supported_tlds = get_supported_tlds()
+    if tld in supported_tlds:
+        return True
+    if tld.isascii():
+        return tld.lower() in supported_tlds
+
+    try:
+        return tld.encode("idna").decode("ascii").lower() in supported_tlds
+    except UnicodeError:
+        return False
+
+
+def _length_errors(value: str) -> List[str]:
+    if len(value) < MIN_LABEL_LENGTH:
+        return [f"Ensure this field has at least {MIN_LABEL_LENGTH} characters."]
+    if len(value) > MAX_LABEL_LENGTH:
+        return [f"Ensure this field has no more than {MAX_LABEL_LENGTH} characters."]
+    return []
@@ -1,67 +1,501 @@
 import asyncio
+import functools
+import hashlib
+import math
+import time
+from typing import Awaitable, Callable, NamedTuple, Union
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import parse_etags, patch_vary_headers
 from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.throttling import UserRateThrottle
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from .serializers import DomainSerializer
+from .cache import get_response_cache
+from .conf import get_setting
+from .models import SearchJob
+from .renderers import dumps
+from .validators import is_supported_tld, validate_domains
 
-from . import engine
+from . import engine, history, jobs, metrics
 
 
-class RegistrationStatus(APIView):
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines awaited on the server's event loop.
+
+    Authentication, permission and throttling checks are synchronous in DRF,
+    so they're run in a thread.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(*args, **kwargs):
+            return await view(*args, **kwargs)
+
+        return functools.update_wrapper(async_view, view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        # mirrors APIView.dispatch
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        timings = metrics.start_timing() if get_setting("TIMING_HEADER") else None
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+
+        except Exception as exc:  # pylint: disable=broad-except
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        if timings:
+            self.response["Server-Timing"] = metrics.server_timing(timings)
+        return self.response
+
+
+class CachedResponse(NamedTuple):
+    """
+    The body of a response of a lookup endpoint, as kept in the response cache.
+
+    Attributes:
+        data (dict): the body
+        etag (str): weak ETag of the body, the same whatever it's rendered as
+        expires_at (float): when the first of the answers in it goes stale
+    """
+
+    data: dict
+    etag: str
+    expires_at: float
+
+    @classmethod
+    def of(cls, data: dict, ttl: float) -> "CachedResponse":
+        """Builds the CachedResponse of `data`, fresh for `ttl` seconds."""
+        digest = hashlib.blake2b(dumps(data).encode(), digest_size=16).hexdigest()
+        return cls(data, f'W/"{digest}"', time.time() + ttl)
+
+
+class RegistrationStatus(AsyncAPIView):
     """
     Fetch information about the registration status of a domain
     """
 
-    def get(self, request):
+    async def get(self, request):
         name, tld = engine.split_domain_name(request.GET.get("domain"))
-        serializer = DomainSerializer(
-            data={
-                "name": name,
-                "tld": tld,
-                "registered": asyncio.run(engine.whois_query(name, tld)),
-            },
-            many=False,
+        # domain names are case insensitive, their cached responses too
+        name, tld = name.lower(), tld.lower()
+        if request.user.is_authenticated:
+            # cached responses are searches too
+            history.record(request.user, f"{name}.{tld}")
+
+        return await _cached_response(
+            request, ("registrationStatus", name, tld), lambda: self._fetch(name, tld)
         )
 
-        if request.user.is_authenticated:
-            request.user.history.append(f"{name}.{tld}")
-            request.user.save()
+    @staticmethod
+    async def _fetch(name: str, tld: str) -> Union[CachedResponse, Response]:
+        with metrics.timed("lookup"):
+            registered = await engine.whois_query(name, tld)
+
+        with metrics.timed("validation"):
+            errors = _domain_errors(name, tld)
+        if errors:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data=errors)
+
+        with metrics.timed("serialization"):
+            data = engine.DomainResult(name, tld, registered)._asdict()
+            return CachedResponse.of(data, engine.freshness(name, tld))
+
+
+class SettingRateThrottle(UserRateThrottle):
+    """
+    Limits how often a user calls a view, at the rate of the setting named
+    by `setting`
+    """
+
+    setting = None
+
+    def get_rate(self):
+        return get_setting(self.setting)
+
+
+class BatchRegistrationStatusThrottle(SettingRateThrottle):
+    """
+    Limits how often a user checks a batch of domains, see BATCH_RATE
+    """
+
+    scope = "batch_registration_status"
+    setting = "BATCH_RATE"
 
-        if not serializer.is_valid():
-            return Response(status=status.HTTP_400_BAD_REQUEST, data=serializer.errors)
 
-        return Response(serializer.data)
+class SearchJobsThrottle(SettingRateThrottle):
+    """
+    Limits how often a user queues search jobs, see JOB_SUBMIT_RATE
+    """
 
+    scope = "search_jobs"
+    setting = "JOB_SUBMIT_RATE"
 
-class SimilarDomains(APIView):
+
+class BatchRegistrationStatus(AsyncAPIView):
+    """
+    Fetch the registration status of many domains, streamed as NDJSON
+    """
+
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (BatchRegistrationStatusThrottle,)
+
+    async def post(self, request):
+        domains = request.data.get("domains")
+        if not isinstance(domains, list) or not all(
+            isinstance(domain, str) for domain in domains
+        ):
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"domains": ["Expected a list of domain names"]},
+            )
+
+        max_domains = get_setting("BATCH_MAX_DOMAINS")
+        if len(domains) > max_domains:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"domains": [f"At most {max_domains} domains are allowed"]},
+            )
+
+        # dict keeps the order, tuples make names that only differ by scheme
+        # or case equal
+        unique = dict.fromkeys(
+            tuple(part.lower() for part in engine.split_domain_name(domain))
+            for domain in domains
+        )
+
+        with metrics.timed("validation"):
+            valid, invalid = validate_domains(unique)
+
+        return StreamingHttpResponse(
+            _stream_batch(valid, invalid), content_type="application/x-ndjson"
+        )
+
+
+class SimilarDomains(AsyncAPIView):
     """
     Fetch similar domain names
     """
 
-    def get(self, request):
+    async def get(self, request):
         name, tld = engine.split_domain_name(request.GET.get("domain"))
-        single_serializer = DomainSerializer(
-            data={
-                "name": name,
-                "tld": tld,
-                "registered": asyncio.run(engine.whois_query(name, tld)),
-            },
-            many=False,
+        # domain names are case insensitive, their cached responses too
+        name, tld = name.lower(), tld.lower()
+        if request.user.is_authenticated:
+            # cached responses are searches too
+            history.record(request.user, f"{name}.{tld}")
+
+        return await _cached_response(
+            request, ("similarDomains", name, tld), lambda: self._fetch(name, tld)
         )
 
+    @staticmethod
+    async def _fetch(name: str, tld: str) -> Union[CachedResponse, Response]:
+        with metrics.timed("lookup"):
+            registered = await engine.whois_query(name, tld)
+
+        with metrics.timed("validation"):
+            errors = _domain_errors(name, tld)
+        if errors:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data=errors)
+        domain = engine.DomainResult(name, tld, registered)._asdict()
+
+        with metrics.timed("similar"):
+            similar_domains, failures = await engine.similar_domains(
+                name,
+                tld,
+                deadline=get_setting("SIMILAR_DEADLINE"),
+                budget=get_setting("SIMILAR_TLD_BUDGET"),
+            )
+
+        with metrics.timed("serialization"):
+            data = {
+                "domain": domain,
+                "similar": [similar._asdict() for similar in similar_domains],
+                "failed": [failure._asdict() for failure in failures],
+            }
+            freshness = [engine.freshness(name, tld)]
+            freshness.extend(
+                engine.freshness(similar.name, similar.tld)
+                for similar in similar_domains
+            )
+            # lookups that failed may not the next time, so it isn't cached
+            return CachedResponse.of(data, 0 if failures else min(freshness))
+
+
+class SimilarDomainsStream(AsyncAPIView):
+    """
+    Fetch similar domain names as Server-Sent Events, each as soon as it's found
+    """
+
+    async def get(self, request):
+        name, tld = engine.split_domain_name(request.GET.get("domain"))
+        with metrics.timed("lookup"):
+            registered = await engine.whois_query(name, tld)
+
         if request.user.is_authenticated:
-            request.user.history.append(f"{name}.{tld}")
-            request.user.save()
+            history.record(request.user, f"{name}.{tld}")
+
+        with metrics.timed("validation"):
+            errors = _domain_errors(name, tld)
+        if errors:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data=errors)
+        domain = engine.DomainResult(name, tld, registered)._asdict()
+
+        response = StreamingHttpResponse(
+            _stream_similar(domain, name, tld),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        # stops nginx and the like from buffering the events
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class Metrics(APIView):
+    """
+    Expose the metrics of the workers in the Prometheus text format
+    """
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+class SearchJobs(APIView):
+    """
+    Queue a search for similar domains, run by the background workers
+    """
+
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (SearchJobsThrottle,)
+
+    def post(self, request):
+        name, tld = engine.split_domain_name(request.data.get("domain") or "")
+        _, invalid = validate_domains([(name, tld)])
+        if invalid:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data=invalid[0][2])
 
-        if not single_serializer.is_valid():
+        # the tlds of a similar domains search unless told otherwise, the
+        # worker looks them up in the order of tldplan
+        tlds = request.data.get("tlds") or (
+            get_setting("SIMILAR_TLDS") or engine.POPULAR_TLDS
+        )
+        if not isinstance(tlds, list) or not all(
+            isinstance(tld, str) and is_supported_tld(tld) for tld in tlds
+        ):
             return Response(
-                status=status.HTTP_400_BAD_REQUEST, data=single_serializer.errors
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"tlds": ["Expected a list of supported TLDs"]},
             )
 
-        similar_domains = asyncio.run(engine.similar_domains(name, tld))
-        similar_serializer = DomainSerializer(similar_domains, many=True)
+        job = jobs.submit(request.user, name, tld, [tld.lower() for tld in tlds])
+        return Response(
+            status=status.HTTP_202_ACCEPTED, data={"id": job.id, "status": job.status}
+        )
+
+
+class SearchJobResults(APIView):
+    """
+    Fetch the status of a search job and the results found so far
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, job_id):
+        job = _get_job(request.user, job_id)
+        if job is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
 
+        try:
+            after = int(request.GET.get("after", 0))
+        except ValueError:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"after": ["Expected the id of a result"]},
+            )
+
+        results = jobs.results_after(job, after, get_setting("JOB_PAGE_SIZE"))
         return Response(
-            {"domain": single_serializer.data, "similar": similar_serializer.data}
+            {
+                "id": job.id,
+                "status": job.status,
+                "domain": {"name": job.name, "tld": job.tld},
+                "similar": [
+                    _job_result(result) for result in results if not result.failure
+                ],
+                "failed": [_job_result(result) for result in results if result.failure],
+                "next": results[-1].id if results else after,
+            }
         )
+
+
+class SearchJobStream(AsyncAPIView):
+    """
+    Fetch the results of a search job as Server-Sent Events, as they're found
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    async def get(self, request, job_id):
+        job = await sync_to_async(_get_job)(request.user, job_id)
+        if job is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(
+            _stream_job(job), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+async def _stream_batch(valid: list, invalid: list):
+    for name, tld, errors in invalid:
+        yield dumps({"name": name, "tld": tld, "errors": errors}) + "\n"
+
+    lookups = engine.lookup_many(valid, get_setting("BATCH_CONCURRENCY"))
+    async for name, tld, registered, error in lookups:
+        line = {"name": name, "tld": tld}
+        if error is None:
+            line["registered"] = registered
+        else:
+            line["error"] = engine.LookupFailure.from_exception(name, tld, error).reason
+        yield dumps(line) + "\n"
+
+
+async def _stream_similar(domain: dict, name: str, tld: str):
+    yield _event("domain", domain)
+
+    similar_domains = engine.iter_similar_domains(
+        name,
+        tld,
+        deadline=get_setting("SIMILAR_DEADLINE"),
+        budget=get_setting("SIMILAR_TLD_BUDGET"),
+    )
+    async for similar in similar_domains:
+        if isinstance(similar, engine.LookupFailure):
+            yield _event("failed", similar._asdict())
+        else:
+            yield _event("similar", similar._asdict())
+
+    yield _event("end", {})
+
+
+async def _stream_job(job: SearchJob):
+    after = 0
+    while True:
+        # read the status first, results found before it changed are read next
+        await sync_to_async(job.refresh_from_db)(fields=["status"])
+        results = await sync_to_async(jobs.results_after)(
+            job, after, get_setting("JOB_PAGE_SIZE")
+        )
+        for result in results:
+            yield _event("failed" if result.failure else "similar", _job_result(result))
+        if results:
+            after = results[-1].id
+            continue
+
+        if job.status in (SearchJob.DONE, SearchJob.FAILED):
+            break
+        await asyncio.sleep(get_setting("JOB_POLL_INTERVAL"))
+
+    yield _event("end", {"status": job.status})
+
+
+async def _cached_response(
+    request,
+    key: tuple,
+    fetch: Callable[[], Awaitable[Union[CachedResponse, Response]]],
+) -> Response:
+    """
+    Answers a lookup endpoint from the response cache, or with what `fetch`
+    returns on a miss.
+
+    Responses carry their ETag, and a Cache-Control max-age of the time the
+    answers in them stay fresh. A request whose If-None-Match has the ETag is
+    answered 304 without a body.
+
+    Args:
+        request (Request): the request
+        key (tuple): the endpoint, and the domain as split by split_domain_name
+            in lower case
+        fetch (Callable): returns an awaitable of the CachedResponse to cache
+            or of a Response to send as is, e.g. an error
+
+    Note:
+        Responses to authenticated users are private, so that shared caches
+        (e.g. a CDN) don't answer them without their searches being recorded.
+    """
+    cache = get_response_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.CACHE_REQUESTS.inc(cache="response", result="hit")
+    else:
+        metrics.CACHE_REQUESTS.inc(cache="response", result="miss")
+        cached = await fetch()
+        if isinstance(cached, Response):
+            return cached
+        if cached.expires_at > time.time():
+            cache.set(key, cached, cached.expires_at - time.time())
+
+    max_age = max(0, math.ceil(cached.expires_at - time.time()))
+    scope = "private" if request.user.is_authenticated else "public"
+    headers = {"ETag": cached.etag, "Cache-Control": f"{scope}, max-age={max_age}"}
+
+    etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+    if "*" in etags or _opaque_tag(cached.etag) in map(_opaque_tag, etags):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    else:
+        response = Response(cached.data, headers=headers)
+    patch_vary_headers(response, ("Authorization",))
+    return response
+
+
+def _opaque_tag(etag: str) -> str:
+    # If-None-Match compares ETags weakly, i.e. without their W/ prefix
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _domain_errors(name: str, tld: str) -> dict:
+    # the errors DomainSerializer would report, without building one
+    _, invalid = validate_domains([(name, tld)])
+    return invalid[0][2] if invalid else {}
+
+
+def _get_job(user, job_id):
+    # the jobs of other users are not found either
+    return SearchJob.objects.filter(id=job_id, user=user).first()
+
+
+def _job_result(result) -> dict:
+    if result.failure:
+        return {"name": result.name, "tld": result.tld, "reason": result.failure}
+    return {"name": result.name, "tld": result.tld, "registered": result.registered}
+
+
+def _event(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {dumps(data)}\n\n"
@@ -0,0 +1,181 @@
+"""Warms the caches and connections of a process before it serves requests"""
+import asyncio
+import datetime
+import logging
+import time
+from typing import List
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError
+from django.db.models import Count
+from django.utils import timezone
+
+from . import backends, candidates, datamuse, engine, zones
+from .cache import get_result_cache
+from .conf import get_setting
+from .models import SearchHistory
+from .scheduler import whois_server
+from .sharedstate import get_rate_limits
+from .validators import get_supported_tlds, is_supported_tld, is_valid_name
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up(names: List[str] = None, concurrency: int = None) -> dict:
+    """
+    Loads the metadata of the TLDs, then reads the hot names and looks them
+    up in the similar TLDs, at most `concurrency` at a time, both within
+    WARMUP_DEADLINE seconds.
+
+    Lookups go through the engine, so their answers fill the caches and
+    their connections stay in the pools of the running event loop.
+
+    Args:
+        names (List[str]): the names to look up, see `hot_names` by default
+        concurrency (int): WARMUP_CONCURRENCY by default
+
+    Returns:
+        A dict of what was warmed: tlds, names, lookups, failed and seconds.
+    """
+    started = time.monotonic()
+    tlds = warm_metadata()
+    tally = {"names": 0, "lookups": 0, "failed": 0}
+
+    try:
+        await asyncio.wait_for(
+            _look_up(names, concurrency or get_setting("WARMUP_CONCURRENCY"), tally),
+            get_setting("WARMUP_DEADLINE"),
+        )
+    except asyncio.TimeoutError:
+        logger.warning(
+            "Warm up stopped at its deadline, %d lookups in", tally["lookups"]
+        )
+
+    return {"tlds": tlds, **tally, "seconds": time.monotonic() - started}
+
+
+def warm_metadata() -> int:
+    """
+    Loads what the first requests would otherwise: the modules of the lookup
+    backend, the WHOIS server of every supported TLD, the RDAP bootstrap, the
+    word index, the zone indexes and the caches.
+
+    Returns:
+        The number of TLDs whose metadata was loaded.
+    """
+    tlds = get_supported_tlds()
+    for tld in tlds:
+        whois_server(tld)
+        zones.get_zone_index(tld)
+    # e.g. the idna codec of internationalized TLDs
+    is_supported_tld("com")
+    is_valid_name("münchen")
+
+    backends.get_backend().prepare()
+    backends.rdap_bootstrap()
+    candidates.get_word_index()
+    get_result_cache()
+    get_rate_limits()
+    return len(tlds)
+
+
+def hot_names(limit: int = None) -> List[str]:
+    """
+    Returns the names to warm up: the WARMUP_NAMES setting, then the names
+    searched the most by users in the last WARMUP_HISTORY_DAYS days.
+
+    Args:
+        limit (int): the most names taken from the search history,
+            WARMUP_HISTORY_NAMES by default
+    """
+    if limit is None:
+        limit = get_setting("WARMUP_HISTORY_NAMES")
+
+    names = list(get_setting("WARMUP_NAMES"))
+    if limit:
+        since = timezone.now() - datetime.timedelta(
+            days=get_setting("WARMUP_HISTORY_DAYS")
+        )
+        try:
+            searched = list(
+                SearchHistory.objects.filter(searched_at__gte=since)
+                .values("domain")
+                .annotate(searches=Count("id"))
+                .order_by("-searches")
+                .values_list("domain", flat=True)[:limit]
+            )
+        except DatabaseError:
+            logger.exception("Couldn't read the most searched names")
+            searched = []
+        names.extend(engine.split_domain_name(domain)[0] for domain in searched)
+
+    # in order, once each
+    return [name for name in dict.fromkeys(names) if is_valid_name(name)]
+
+
+async def _look_up(names: List[str], concurrency: int, tally: dict):
+    if names is None:
+        names = await sync_to_async(hot_names)()
+    tally["names"] = len(names)
+
+    tlds = get_setting("SIMILAR_TLDS") or engine.POPULAR_TLDS
+    if get_setting("SIMILAR_NAMES_SOURCE") == "datamuse":
+        # opens the connections to Datamuse too
+        await asyncio.gather(
+            *[datamuse.suggestions(name) for name in names], return_exceptions=True
+        )
+
+    domains = [(name, tld) for name in names for tld in tlds]
+    async for _, _, _, error in engine.lookup_many(domains, concurrency):
+        tally["lookups"] += 1
+        tally["failed"] += error is not None
+
+
+def with_warm_up(application):
+    """
+    Wraps an ASGI application so that every process warms up (see `warm_up`)
+    when the server starts it, before it accepts requests.
+
+    Note:
+        Only servers that send ASGI lifespan events (e.g. uvicorn) start it.
+        Django's handler doesn't take them, so they're not passed on.
+    """
+
+    async def app(scope, receive, send):
+        if scope["type"] != "lifespan":
+            return await application(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if get_setting("WARMUP_ON_STARTUP"):
+                    await _warm_up_logged()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    return app
+
+
+def warm_up_wsgi():
+    """
+    Warms up a WSGI process, if WARMUP_WSGI is set.
+
+    Note:
+        runserver imports the WSGI application on every reload, and a server
+        preloading it imports it once before forking its workers, so it's
+        off by default. Connections opened by the lookups are dropped with
+        the event loop they're run on, only the metadata and the caches stay
+        warm.
+    """
+    if get_setting("WARMUP_WSGI"):
+        asyncio.run(_warm_up_logged())
+
+
+async def _warm_up_logged():
+    try:
+        logger.info("Warmed up: %s", await warm_up())
+    except Exception:  # pylint: disable=broad-except
+        # a cold process still serves requests
+        logger.exception("Couldn't warm up")
@@ -0,0 +1,162 @@
+"""Minimal async WHOIS client that tells available domains apart without parsing"""
+import asyncio
+import re
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+from .conf import get_setting
+from .scheduler import IANA_WHOIS_SERVER
+
+WHOIS_PORT = 43
+
+# what the WHOIS server of each registry answers for an unregistered domain
+NO_MATCH = {
+    server: re.compile(signature, re.IGNORECASE | re.MULTILINE)
+    for server, signature in {
+        "whois.verisign-grs.com": r"^No match for ",
+        "whois.pir.org": r"^(NOT FOUND|Domain not found\.)",
+        "whois.nic.google": r"^Domain not found\.",
+        "whois.nic.co": r"DOMAIN NOT FOUND|^No Data Found",
+        "whois.nic.io": r"^(NOT FOUND|Domain not found\.)",
+        "whois.afilias.net": r"^(NOT FOUND|Domain not found\.)",
+        "whois.nic.uk": r"^\s*No match for ",
+        "whois.denic.de": r"^Status: free",
+        "whois.nic.fr": r"^%+ NOT FOUND",
+        "whois.jprs.jp": r"No match!!",
+        "whois.eu": r"^Status:\s+AVAILABLE",
+        "whois.dns.be": r"^Status:\s+AVAILABLE",
+        "whois.nic.it": r"^Status:\s+AVAILABLE",
+        "whois.domain-registry.nl": r"is free",
+        "whois.cira.ca": r"^Not found: ",
+        "whois.auda.org.au": r"^NOT FOUND",
+        "whois.tcinet.ru": r"^No entries found",
+        "whois.dns.pl": r"^No information available about domain name",
+        "whois.iis.se": r"not found\.",
+    }.items()
+}
+# the checks asyncwhois does for every other server
+DEFAULT_NO_MATCH = re.compile(
+    "no match|not found|no entries found|invalid query|domain name not known"
+    "|no object found",
+    re.IGNORECASE,
+)
+_REFER_RE = re.compile(r"^refer:\s*(\S+)", re.IGNORECASE | re.MULTILINE)
+
+
+class WhoisAnswer(NamedTuple):
+    """
+    The raw answer of a WHOIS server.
+
+    Attributes:
+        server (str): the server that answered, after referrals
+        text (str): what it answered
+    """
+
+    server: str
+    text: str
+
+    @property
+    def available(self) -> bool:
+        """If the answer says the domain isn't registered."""
+        return bool(NO_MATCH.get(self.server, DEFAULT_NO_MATCH).search(self.text))
+
+
+class WhoisError(ConnectionError):
+    """
+    Raised when a WHOIS server closes the connection without answering, as
+    some do when they're queried too often
+    """
+
+
+async def fetch(domain: str, server: str) -> WhoisAnswer:
+    """
+    Queries a WHOIS server for a domain, without parsing the answer.
+
+    Args:
+        domain (str): the domain, e.g. "google.com"
+        server (str): the WHOIS server of its tld, IANA's answer is followed
+            to the server it refers to
+
+    Returns:
+        The WhoisAnswer of the server.
+    """
+    text = await _query(domain, server)
+    if server == IANA_WHOIS_SERVER:
+        refer = _REFER_RE.search(text)
+        if refer:
+            server = refer.group(1).lower()
+            text = await _query(domain, server)
+    return WhoisAnswer(server, text)
+
+
+async def parse(answer: WhoisAnswer, tld: str) -> dict:
+    """
+    Parses every field of a registered domain's answer with asyncwhois, in
+    the parse executor so that the event loop isn't held up.
+
+    Returns:
+        The fields asyncwhois found, e.g. "expires".
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_parse_executor(), _parse, answer.text, tld)
+
+
+def whois_address(server: str) -> Tuple[str, int]:
+    """
+    Returns the (host, port) `server` is queried at, see the WHOIS_ADDRESSES
+    setting.
+    """
+    addresses = get_setting("WHOIS_ADDRESSES")
+    address = addresses.get(server, addresses.get("*"))
+    if address is None:
+        return server, WHOIS_PORT
+    host, _, port = address.rpartition(":")
+    return host, int(port)
+
+
+@lru_cache(maxsize=None)
+def get_parse_executor() -> Executor:
+    """
+    Returns the process wide pool answers are parsed in, of threads or
+    processes as set by WHOIS_PARSE_EXECUTOR.
+    """
+    workers = get_setting("WHOIS_PARSE_WORKERS")
+    if get_setting("WHOIS_PARSE_EXECUTOR") == "process":
+        # imports multiprocessing, which the thread pool doesn't need
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(workers)
+    return ThreadPoolExecutor(workers, thread_name_prefix="whois-parse")
+
+
+async def _query(domain: str, server: str) -> str:
+    timeout = get_setting("LOOKUP_TIMEOUT")
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(*whois_address(server)), timeout
+    )
+    try:
+        writer.write(f"{domain}\r\n".encode())
+        text = (await reader.read()).decode("utf-8", errors="ignore")
+    finally:
+        writer.close()
+    if not text:
+        raise WhoisError(f"empty WHOIS answer from {server} for {domain}")
+    return text
+
+
+def _parse(text: str, tld: str) -> dict:
+    # imported by the first answer parsed, in the process parsing it
+    # pylint: disable=import-outside-toplevel
+    from asyncwhois.errors import NotFoundError
+    from asyncwhois.parse_tld import DomainParser
+
+    parser = DomainParser(tld)
+    try:
+        parser.parse(text)
+    except NotFoundError:
+        # the answer matched no signature of an available domain, but one of
+        # the broader checks of asyncwhois
+        return {}
+    return parser.parser_output
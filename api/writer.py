@@ -0,0 +1,94 @@
+"""Writes rows to the database in batches, off the request path"""
+import atexit
+import logging
+import threading
+from typing import Callable, List
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """
+    Collects items and hands them to `write` in batches from a thread.
+
+    A batch is written once `batch_size` items are waiting or `interval`
+    seconds after the first of them was added, whichever comes first. Items
+    still waiting when the process exits are written then. Batches are
+    written one at a time, in the order their items were added.
+
+    Attributes:
+        write (Callable): writes a list of items, e.g. with a bulk insert
+        batch_size (int): the most items written at once
+        interval (float): seconds an item waits at most before it's written
+    """
+
+    def __init__(self, write: Callable[[List], None], batch_size: int, interval: float):
+        self.write = write
+        self.batch_size = batch_size
+        self.interval = interval
+        self._items = []
+        self._condition = threading.Condition()
+        # held from taking a batch until it's written
+        self._writing = threading.Lock()
+        self._error = None
+        self._thread = None
+
+    def add(self, item):
+        """Queues `item` to be written."""
+        with self._condition:
+            self._items.append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="batch-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self._write_waiting)
+            if len(self._items) >= self.batch_size:
+                self._condition.notify()
+
+    def flush(self):
+        """
+        Writes every waiting item now, and waits for the batch being written.
+
+        Raises:
+            The error of the first batch that couldn't be written since the
+            last flush, its items are lost.
+        """
+        self._write_waiting()
+        with self._condition:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._items)
+                self._condition.wait_for(
+                    lambda: len(self._items) >= self.batch_size, self.interval
+                )
+            self._write_waiting()
+
+    def _write_waiting(self):
+        while True:
+            with self._writing:
+                with self._condition:
+                    batch = self._items[: self.batch_size]
+                    del self._items[: self.batch_size]
+                if not batch:
+                    return
+                self._write(batch)
+
+    def _write(self, batch: List):
+        # the thread keeps its own connection, drop it if it went stale
+        close_old_connections()
+        try:
+            self.write(batch)
+        except Exception as exc:  # pylint: disable=broad-except
+            # kept for the next flush, the thread has nobody to raise it to
+            logger.exception("Couldn't write %d rows", len(batch))
+            with self._condition:
+                if self._error is None:
+                    self._error = exc
@@ -0,0 +1,165 @@
+"""Bloom filters of the names registered in a TLD, built from zone files"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .conf import get_setting
+
+
+class ZoneIndex:
+    """
+    Bloom filter of the names of a TLD in a memory-mapped file.
+
+    A name that isn't in the filter was in none of the dumps it was built
+    from, a name that is may be a false positive (see `error_rate`).
+
+    Attributes:
+        hashes (int): bits set per name
+        bits (int): size of the filter in bits
+        count (int): names added so far
+    """
+
+    MAGIC = b"DFZI"
+    HEADER = struct.Struct("!4sHQQ")
+
+    def __init__(self, path, writable: bool = False):
+        with open(path, "r+b" if writable else "rb") as index_file:
+            self._map = mmap.mmap(
+                index_file.fileno(),
+                0,
+                access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ,
+            )
+
+        magic, self.hashes, self.bits, self.count = self.HEADER.unpack_from(self._map)
+        if magic != self.MAGIC:
+            raise ValueError(f"{path} isn't a zone index")
+
+    def __contains__(self, name: str) -> bool:
+        return all(
+            self._map[self.HEADER.size + bit // 8] & (1 << bit % 8)
+            for bit in self._bits(name)
+        )
+
+    def add(self, names: Iterable[str]) -> int:
+        """
+        Adds `names` to the filter, which must have been opened writable.
+
+        Returns:
+            The number of names added.
+        """
+        added = 0
+        for name in names:
+            for bit in self._bits(name):
+                self._map[self.HEADER.size + bit // 8] |= 1 << bit % 8
+            added += 1
+        self.count += added
+        self.HEADER.pack_into(
+            self._map, 0, self.MAGIC, self.hashes, self.bits, self.count
+        )
+        self._map.flush()
+        return added
+
+    def error_rate(self) -> float:
+        """Returns the expected false positive rate with the names added so far."""
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def _bits(self, name: str):
+        # double hashing, from the two halves of a single digest
+        digest = hashlib.blake2b(name.encode(), digest_size=16).digest()
+        first, second = struct.unpack("!QQ", digest)
+        return ((first + i * second) % self.bits for i in range(self.hashes))
+
+    @classmethod
+    def create(cls, path, capacity: int, error_rate: float) -> "ZoneIndex":
+        """
+        Creates an empty filter sized for `capacity` names at `error_rate`.
+
+        Returns:
+            The filter, opened writable.
+        """
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        hashes = max(1, round(bits / capacity * math.log(2)))
+
+        # written next to the old one and moved over it, so that processes
+        # that mapped the old one keep a consistent view
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as index_file:
+            index_file.write(cls.HEADER.pack(cls.MAGIC, hashes, bits, 0))
+            index_file.truncate(cls.HEADER.size + math.ceil(bits / 8))
+        os.replace(tmp_path, path)
+        return cls(path, writable=True)
+
+
+def zone_names(lines: Iterable[str], tld: str) -> Iterable[str]:
+    """
+    Yields the names of `tld` in a zone file or a list of domains.
+
+    Every line starting with a domain is read, relative ("google") or
+    absolute ("google.com."). Comments, directives and records of the TLD
+    itself are skipped, and names are only yielded once in a row (zone files
+    list every record of a name together).
+    """
+    suffix = "." + tld.lower()
+    previous = None
+    for line in lines:
+        if not line or line[0] in ";$ \t\n":
+            continue
+        name = line.split(maxsplit=1)[0].rstrip(".").lower()
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+        if not name or name == tld.lower() or "." in name or name == previous:
+            continue
+        previous = name
+        yield name
+
+
+def index_path(tld: str) -> Optional[Path]:
+    """
+    Returns where the zone index of `tld` is kept, None if ZONE_INDEX_DIR
+    isn't set.
+    """
+    directory = get_setting("ZONE_INDEX_DIR")
+    if not directory:
+        return None
+    return Path(directory) / f"{tld.lower()}.bloom"
+
+
+@lru_cache(maxsize=None)
+def get_zone_index(tld: str) -> Optional[ZoneIndex]:
+    """
+    Returns the zone index of `tld`, or None if it has none.
+
+    Note:
+        Names added to an existing index are seen right away, an index
+        created or built again from scratch once the process restarts.
+    """
+    path = index_path(tld)
+    if path is None or not path.exists():
+        return None
+    return ZoneIndex(path)
+
+
+def in_zone(name: str, tld: str) -> Optional[bool]:
+    """
+    Checks if a name is in the zone index of its TLD.
+
+    Returns:
+        True if it probably is (registered), False if it definitely isn't,
+        None if the TLD has no index.
+    """
+    index = get_zone_index(tld.lower())
+    if index is None:
+        return None
+    if name.isascii():
+        return name.lower() in index
+    try:
+        # zone files list internationalized names in their punycode form
+        return name.lower().encode("idna").decode("ascii") in index
+    except UnicodeError:
+        return False
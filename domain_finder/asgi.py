@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'domain_finder.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once the apps are loaded
+from api.warmup import with_warm_up  # noqa: E402 pylint: disable=wrong-import-position
+
+application = with_warm_up(django_application)
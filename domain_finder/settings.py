@@ -79,6 +79,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "domain_finder.wsgi.application"
+ASGI_APPLICATION = "domain_finder.asgi.application"
 
 
 # Database
@@ -143,6 +144,10 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
 SIMPLE_JWT = {
@@ -151,6 +156,18 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(minutes=360),
 }
 
+DJOSER = {
+    "SERIALIZERS": {
+        "user_create": "api.serializers.UserCreateSerializer",
+        "current_user": "api.serializers.UserSerializer",
+    },
+}
+
 AUTH_USER_MODEL = "api.User"
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Lookup engine, see api/conf.py for the available settings and their defaults
+DOMAIN_FINDER = {
+    "CACHE_ALIAS": os.environ.get("DOMAIN_FINDER_CACHE_ALIAS"),
+}
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'domain_finder.settings')
 
 application = get_wsgi_application()
+
+# imported once the apps are loaded
+from api.warmup import warm_up_wsgi  # noqa: E402 pylint: disable=wrong-import-position
+
+warm_up_wsgi()